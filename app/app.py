@@ -1,11 +1,20 @@
 import streamlit as st
 import pandas as pd
-import pickle
 import plotly.graph_objects as go
 import os
-import subprocess
+import io
 import sys
 
+# ✅ Shared modules (feature pipeline, data store, model registry) live in src/
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from model_registry import model_token
+from forecast_cache import compute_forecast, load_forecast
+from charts import external_figure, forecast_figure, themed
+from scenarios import forecast_scenarios, price_paths, scenario_grid, weather_paths
+from training_jobs import JobQueue
+from dataset_store import BACKTEST_METRICS_PATH, load_history, load_sales, load_seasonality, source_signature
+from instrumentation import enabled, stage, track
+
 # ✅ Configuración inicial (Debe ser la primera línea)
 st.set_page_config(page_title="Pronóstico Demanda Leche", page_icon="🥛", layout="wide")
 
@@ -17,104 +26,150 @@ theme_choice = st.sidebar.radio("Modo de Visualización", ["🌙 Oscuro", "☀
 selected_theme = "plotly_dark" if theme_choice == "🌙 Oscuro" else "plotly_white"
 st.markdown(f"<style>body {{ background-color: {'#1e1e1e' if theme_choice == '🌙 Oscuro' else 'white'}; color: {'white' if theme_choice == '🌙 Oscuro' else 'black'}; }}</style>", unsafe_allow_html=True)
 
-# ✅ Load Data
-DATA_PATH = "data/dairy_forecast_data.csv"
-SEASONALITY_PATH = "data/dairy_seasonality.csv"
-EXTERNAL_DATA_PATH = "data/external_factors.csv"
-
-uploaded_file = st.sidebar.file_uploader("📂 Sube tu archivo CSV", type=["csv"])
-df = pd.read_csv(uploaded_file if uploaded_file else DATA_PATH, parse_dates=["Date"]).rename(columns={"Sales_Volume": "y", "Date": "ds"})
-
-# ✅ Load External Factors (Fix `parse_dates` issue)
-if os.path.exists(EXTERNAL_DATA_PATH):
-    external_df = pd.read_csv(EXTERNAL_DATA_PATH)
+# ✅ Stage Timers (src/instrumentation.py): per session from the sidebar (this session's thread only, the
+# process-wide switch is DAIRY_INSTRUMENT for CLI runs); cache hits record nothing
+show_timings = st.sidebar.checkbox("⏱️ Medir tiempos por etapa", value=enabled())
+stage_events = track(show_timings)
 
-    # ✅ Ensure correct column names
-    if "Date" in external_df.columns:
-        external_df.rename(columns={"Date": "ds"}, inplace=True)
+# 📌 Registry names of the selectable models (src/model_registry.py)
+MODEL_NAMES = {
+    "Facebook Prophet": "prophet",
+    "SAP IBP (LightGBM)": "sap_ibp",
+    "Oracle SCM (XGBoost)": "oracle_scm"
+}
 
-    # ✅ Convert 'ds' to datetime in both DataFrames before merging
-    external_df["ds"] = pd.to_datetime(external_df["ds"])
-    df["ds"] = pd.to_datetime(df["ds"])
+# ✅ Cache Layer: every widget change reruns this script, so file reads, the merge
+# and prediction are cached on (data signature, model version, days).
+# ✅ Load Data (Arrow/Parquet store from src/dataset_store.py / src/ingest.py if present, otherwise the project CSVs)
+@st.cache_data(show_spinner=False)
+def load_data(data_source, data_signature, external_signature):
+    # `data_source` is the uploaded file's bytes (hashed by content) or None for the project data
+    sales = None
+    if data_source is not None:
+        with stage("load.upload"):
+            sales = pd.read_csv(io.BytesIO(data_source), parse_dates=["Date"]).rename(columns={"Sales_Volume": "y", "Date": "ds"})
+    df = load_history(sales)
+    warning = None
+
+    # ✅ Load External Factors (merged by load_history when the columns are correct)
+    if external_signature is None:
+        warning = "⚠ No se encontraron datos de clima y precios. Se usarán valores por defecto."
+    elif not {"Temperature", "Price"}.issubset(df.columns):
+        warning = "⚠ El archivo de clima/precios no tiene las columnas correctas. Se usarán valores por defecto."
+
+    # ✅ Default values if missing
+    df["Temperature"] = df["Temperature"].fillna(22) if "Temperature" in df.columns else 22.0
+    df["Price"] = df["Price"].fillna(20) if "Price" in df.columns else 20.0
+    return df, warning
+
+@st.cache_data(show_spinner=False)
+def load_seasonality_data(signature):
+    return load_seasonality()
+
+@st.cache_data(show_spinner=False)
+def load_chart_history(data_signature, start):
+    # ✅ Only `ds`/`y` inside the chart window are read (projection + date pushdown on the store)
+    return load_sales(columns=["ds", "y"], start=start)
+
+@st.cache_data(show_spinner=False)
+def load_backtest_summary(signature):
+    metrics = pd.read_csv(BACKTEST_METRICS_PATH)
+    return metrics.groupby("model")[["mape", "wape", "bias", "seconds"]].mean().round(4)
+
+@st.cache_data(show_spinner=False)
+def generate_forecast(model_choice, model_version, data_source, data_signature, external_signature):
+    # ✅ Always the 365-day forecast: the `days` slider only slices it, so moving it never re-predicts
+    if data_source is None:
+        # Project data: lookup of the forecast persisted right after training (src/forecast_cache.py)
+        return load_forecast(MODEL_NAMES[model_choice])
+    df, _ = load_data(data_source, data_signature, external_signature)
+    # Uploaded data: inference once per file and model version (the registry keeps loaded versions in an LRU)
+    return compute_forecast(MODEL_NAMES[model_choice], df)
+
+@st.cache_data(show_spinner=False)
+def forecast_chart(model_choice, model_version, data_source, data_signature, external_signature, days, start, end):
+    # ✅ Figure built once per (data, model version, horizon, window) without a theme; only the window's history is read
+    forecast = generate_forecast(model_choice, model_version, data_source, data_signature, external_signature).iloc[:days]
+    history = load_chart_history(data_signature, start) if data_source is None else load_data(data_source, data_signature, external_signature)[0][["ds", "y"]]
+    return forecast_figure(history, forecast, model_choice, start=start, end=end)
+
+@st.cache_data(show_spinner=False)
+def external_chart(data_source, data_signature, external_signature, start, end):
+    return external_figure(load_data(data_source, data_signature, external_signature)[0], start=start, end=end)
+
+@st.cache_data(show_spinner=False)
+def generate_scenarios(model_choice, model_version, data_source, data_signature, external_signature, days, price_changes, use_weather):
+    # ✅ Every scenario in one stacked predict call; returns the scenario × date cube
+    df, _ = load_data(data_source, data_signature, external_signature)
+    dates = pd.date_range(start=df["ds"].max() + pd.Timedelta(days=1), periods=days, freq="D")
+    paths = {"Price": price_paths(df, dates, price_changes)}
+    weather = weather_paths(dates) if use_weather else ([], None)
+    if weather[0]:
+        paths["Temperature"] = weather
+    scenarios, exogenous = scenario_grid(**paths)
+    return forecast_scenarios(MODEL_NAMES[model_choice], df, days, scenarios, exogenous)
 
-    if {"ds", "Temperature", "Price"}.issubset(external_df.columns):
-        df = df.merge(external_df, on="ds", how="left")
-    else:
-        st.warning("⚠ El archivo de clima/precios no tiene las columnas correctas. Se usarán valores por defecto.")
-else:
-    st.warning("⚠ No se encontraron datos de clima y precios. Se usarán valores por defecto.")
+uploaded_file = st.sidebar.file_uploader("📂 Sube tu archivo CSV", type=["csv"])
+data_source = uploaded_file.getvalue() if uploaded_file else None
+data_signature = None if uploaded_file else source_signature("sales")
+external_signature = source_signature("external")
 
-# ✅ Default values if missing
-df["Temperature"] = df["Temperature"].fillna(22)
-df["Price"] = df["Price"].fillna(20)
+df, data_warning = load_data(data_source, data_signature, external_signature)
+if data_warning:
+    st.warning(data_warning)
 
 # ✅ Sidebar: Model Selection
 model_choice = st.sidebar.selectbox("Modelo de Pronóstico:", ["Facebook Prophet", "SAP IBP (LightGBM)", "Oracle SCM (XGBoost)"])
 days = st.sidebar.slider("⏳ Días a predecir:", 30, 365, 90)
+HISTORY_WINDOWS = {"Todo": None, "Último año": 365, "Últimos 6 meses": 180, "Últimos 90 días": 90}
+history_window = st.sidebar.selectbox("🗓️ Historial en la gráfica:", list(HISTORY_WINDOWS))
+
+# 📌 Train Model Button (background job queue shared by every session; identical jobs are de-duplicated)
+@st.cache_resource
+def get_job_queue():
+    return JobQueue()
 
-# 📌 Train Model Button
+job_queue = get_job_queue()
 if st.sidebar.button("Entrenar Modelo"):
-    TRAIN_SCRIPTS = {
-        "Facebook Prophet": "src/train_model.py",
-        "SAP IBP (LightGBM)": "src/sap_ibp_forecast.py",
-        "Oracle SCM (XGBoost)": "src/oracle_scm_forecast.py"
-    }
-    st.info("🔄 Instalando dependencias y entrenando modelo...")
-    subprocess.run([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
-    process = subprocess.Popen([sys.executable, TRAIN_SCRIPTS[model_choice]], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-
-    training_logs = st.empty()
-    log_text = ""
-    for line in process.stdout:
-        log_text += line + "\n"
-        training_logs.text_area("Registro de Entrenamiento:", log_text, height=200)
-
-    process.wait()
-    if process.returncode == 0:
-        st.success(f"✅ {model_choice} entrenado correctamente.")
+    st.session_state["training_job"] = job_queue.submit(MODEL_NAMES[model_choice]).id
+
+@st.fragment(run_every="2s")
+def training_status():
+    # ✅ Polls the job without rerunning the page; the session never blocks while training runs
+    job = job_queue.get(st.session_state.get("training_job", ""))
+    if job is None:
+        return
+    if not job.done:
+        st.info(f"🔄 {job.name} [{job.id}] {job.status} ({job.elapsed:.0f}s): {job.progress}")
+        if st.button("Cancelar entrenamiento", key=f"cancel-{job.id}"):
+            job_queue.cancel(job.id)
+    elif job.status == "succeeded":
+        st.success(f"✅ {job.name} entrenado correctamente ({job.elapsed:.0f}s).")
     else:
-        st.error(f"❌ Error en el entrenamiento.")
+        st.error(f"❌ Entrenamiento {job.status}: {job.progress}")
+    with st.expander("Registro de Entrenamiento"):
+        st.code("\n".join(job.logs))
+    if job.done and st.session_state.get("training_job_seen") != job.id:
+        # Rerun the whole page once so the newly activated model version is used
+        st.session_state["training_job_seen"] = job.id
+        st.rerun()
 
-# 📌 Load Model
-MODEL_PATHS = {
-    "Facebook Prophet": "models/trained_model.pkl",
-    "SAP IBP (LightGBM)": "models/sap_ibp_model.pkl",
-    "Oracle SCM (XGBoost)": "models/oracle_scm_model.pkl"
-}
-model_path = MODEL_PATHS[model_choice]
-
-with open(model_path, "rb") as f:
-    model = pickle.load(f)
-
-# 📌 Generate Predictions
-future_dates = pd.date_range(start=df["ds"].max() + pd.Timedelta(days=1), periods=days, freq="D")
-
-if model_choice == "Facebook Prophet":
-    future = pd.DataFrame({"ds": future_dates})
-    forecast = model.predict(future)[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
-else:
-    future_features = pd.DataFrame({
-        "year": future_dates.year,
-        "month": future_dates.month,
-        "day": future_dates.day,
-        "day_of_week": future_dates.dayofweek,
-        "Temperature": df["Temperature"].mean(),
-        "Price": df["Price"].mean()
-    })
-    forecast_values = model.predict(future_features)
-    forecast = pd.DataFrame({"ds": future_dates, "yhat": forecast_values, "yhat_lower": forecast_values - 10, "yhat_upper": forecast_values + 10})
+with st.sidebar:
+    training_status()
 
 # ✅ Restaurar Icono de Alpura y Título
 st.title("Pronóstico de la Demanda - Leche Alpura Deslactosada 🥛")
 st.text("Sin gastar en Oracle SCM o SAP IBP. Por Marvin Nahmias ©2025.")
 
 # 📌 Display Seasonality Graph
-if os.path.exists(SEASONALITY_PATH):
-    seasonality_df = pd.read_csv(SEASONALITY_PATH)
-    fig_seasonality = go.Figure()
-    fig_seasonality.add_trace(go.Scatter(x=seasonality_df["Month"], y=seasonality_df["Seasonality"], mode='lines+markers', name="Estacionalidad", line=dict(color="blue")))
-    fig_seasonality.update_layout(title="Estacionalidad del Consumo de Lácteos en México", xaxis_title="Mes", yaxis_title="Índice de Consumo", template=selected_theme)
-    st.plotly_chart(fig_seasonality, use_container_width=True)
+seasonality_signature = source_signature("seasonality")
+if seasonality_signature is not None:
+    seasonality_df = load_seasonality_data(seasonality_signature)
+    with stage("plot.seasonality"):
+        fig_seasonality = go.Figure()
+        fig_seasonality.add_trace(go.Scatter(x=seasonality_df["Month"], y=seasonality_df["Seasonality"], mode='lines+markers', name="Estacionalidad", line=dict(color="blue")))
+        fig_seasonality.update_layout(title="Estacionalidad del Consumo de Lácteos en México", xaxis_title="Mes", yaxis_title="Índice de Consumo", template=selected_theme)
+        st.plotly_chart(fig_seasonality, use_container_width=True)
     st.markdown("""
     **Fuentes de Datos**\n\n
     **INEGI** – Estadísticas agropecuarias.\n   
@@ -122,20 +177,55 @@ if os.path.exists(SEASONALITY_PATH):
     **FAO Dairy Market Review** – Reporte internacional sobre consumo de lácteos.\n
     """)
 
-# 📌 Display Graph for Temperature and Price Trends
-fig_external = go.Figure()
-fig_external.add_trace(go.Scatter(x=df["ds"], y=df["Temperature"], mode='lines', name="Temperatura", line=dict(color="red")))
-fig_external.add_trace(go.Scatter(x=df["ds"], y=df["Price"], mode='lines', name="Precio", line=dict(color="green")))
-fig_external.update_layout(title="Variación de Temperatura y Precio", xaxis_title="Fecha", template=selected_theme)
-st.plotly_chart(fig_external, use_container_width=True)
-
-# 📌 Display Prediction Graph
-fig = go.Figure()
-fig.add_trace(go.Scatter(x=df['ds'], y=df['y'], mode='markers', name="Ventas Históricas", marker=dict(color='#0f4c75', size=5)))
-fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat'], mode='lines', name=f"Pronóstico ({model_choice})", line=dict(color='#3282b8', width=3)))
-fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat_upper'], mode='lines', name="Límite Superior", line=dict(dash="dot", color='rgba(50, 130, 200, 0.5)')))
-fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat_lower'], mode='lines', name="Límite Inferior", line=dict(dash="dot", color='rgba(50, 130, 200, 0.5)'), fill='tonexty'))
-
-fig.update_layout(title="📈 Pronóstico de Ventas (Pasado + Futuro Sin Cortes)", xaxis_title="Fecha", yaxis_title="Ventas (litros)", template=selected_theme, xaxis=dict(rangeslider=dict(visible=True), type="date"), yaxis=dict(fixedrange=False))
-
-st.plotly_chart(fig, use_container_width=True)
+# 📌 Chart Window: the history window picks the default; the slider narrows it and the visible points are
+# re-sampled server-side (LTTB / min-max in src/charts.py), so zooming in shows full detail
+window_days = HISTORY_WINDOWS[history_window]
+first_day, last_day = df["ds"].min().date(), df["ds"].max().date()
+default_start = max(first_day, last_day - pd.Timedelta(days=window_days - 1)) if window_days else first_day
+chart_start, chart_end = st.slider("🔍 Ventana del historial:", min_value=first_day, max_value=last_day, value=(default_start, last_day), format="YYYY-MM-DD")
+
+# 📌 Display Graph for Temperature and Price Trends (cached figure; the theme only swaps its template)
+with stage("plot.external"):
+    st.plotly_chart(themed(external_chart(data_source, data_signature, external_signature, chart_start, chart_end), selected_theme), use_container_width=True)
+
+# 📌 Load Model, Generate Predictions & Display Prediction Graph (cached until the active model version, the data,
+# the horizon or the window change)
+with stage("plot.forecast"):
+    figure = forecast_chart(model_choice, model_token(MODEL_NAMES[model_choice]), data_source, data_signature, external_signature, days, chart_start, chart_end)
+    st.plotly_chart(themed(figure, selected_theme), use_container_width=True)
+
+# 📌 Model Comparison (rolling-origin backtest written by src/backtest.py, when it has been run)
+if os.path.exists(BACKTEST_METRICS_PATH):
+    st.subheader("📊 Comparación de Modelos (Backtesting)")
+    st.dataframe(load_backtest_summary(os.stat(BACKTEST_METRICS_PATH).st_mtime_ns), use_container_width=True)
+
+# 📌 What-If Scenarios (tree models only: Prophet was trained without Temperature/Price)
+if model_choice != "Facebook Prophet":
+    with st.expander("🔮 Escenarios What-If (Precio y Clima)"):
+        price_range = st.slider("Cambio de precio (%)", -50, 50, (-20, 20), step=5)
+        price_steps = st.slider("Número de precios", 2, 41, 9)
+        use_weather = st.checkbox("Combinar con el clima de cada año histórico", value=True)
+        step = (price_range[1] - price_range[0]) / (price_steps - 1)
+        price_changes = tuple(round((price_range[0] + i * step) / 100, 4) for i in range(price_steps))
+        scenario_forecast = generate_scenarios(model_choice, model_token(MODEL_NAMES[model_choice]), data_source, data_signature, external_signature, days, price_changes, use_weather)
+
+        totals = scenario_forecast.totals().sort_values("total", ascending=False)
+        st.caption(f"{len(totals)} escenarios × {days} días evaluados en una sola predicción.")
+        fig_scenarios = go.Figure()
+        fig_scenarios.add_trace(go.Scatter(x=scenario_forecast.dates, y=scenario_forecast.yhat.max(axis=0), mode='lines', name="Máximo", line=dict(dash="dot", color='rgba(50, 130, 200, 0.5)')))
+        fig_scenarios.add_trace(go.Scatter(x=scenario_forecast.dates, y=scenario_forecast.yhat.min(axis=0), mode='lines', name="Mínimo", line=dict(dash="dot", color='rgba(50, 130, 200, 0.5)'), fill='tonexty'))
+        fig_scenarios.add_trace(go.Scatter(x=scenario_forecast.dates, y=pd.DataFrame(scenario_forecast.yhat).median(axis=0), mode='lines', name="Mediana", line=dict(color='#3282b8', width=3)))
+        fig_scenarios.update_layout(title="📈 Rango de Pronóstico entre Escenarios", xaxis_title="Fecha", yaxis_title="Ventas (litros)", template=selected_theme)
+        st.plotly_chart(fig_scenarios, use_container_width=True)
+        st.dataframe(totals, use_container_width=True, hide_index=True)
+
+# 📌 Stage Timings of this rerun (cached steps only show up on the rerun that computed them)
+if show_timings:
+    with st.sidebar.expander("⏱️ Tiempos de esta ejecución"):
+        if stage_events:
+            timings = pd.DataFrame(stage_events)
+            timings["ms"] = (timings["seconds"] * 1000).round(1)
+            timings["MB"] = (timings["rss_growth_bytes"].fillna(0) / 2**20).round(1)
+            st.dataframe(timings[["stage", "ms", "MB"]], use_container_width=True, hide_index=True)
+        else:
+            st.caption("Todo vino de caché en esta ejecución.")
@@ -26,7 +26,7 @@ df = pd.DataFrame({"Date": date_range})
 
 # Apply Monthly Seasonality
 df["month"] = df["Date"].dt.month
-df["seasonality"] = df["month"].apply(lambda x: seasonality_pattern[x - 1])
+df["seasonality"] = seasonality_pattern[df["month"].to_numpy() - 1]
 
 # Add Controlled Randomness to Simulate Demand Variability
 np.random.seed(42)
@@ -0,0 +1,179 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from batch_forecast import (SERIES_COL, exogenous_columns, fit_predict_prophet, init_prophet_worker, load_long_table,
+                            tree_matrix, tree_model)
+from dataset_store import BACKTEST_DIR, BACKTEST_METRICS_PATH, load_history
+from features import FeaturePipeline
+
+# Get Paths (shared with the dashboard through dataset_store)
+OUTPUT_DIR = BACKTEST_DIR
+METRICS_PATH = BACKTEST_METRICS_PATH
+
+# 📌 Expanding-Window Rolling Origin: fold k trains on everything up to its cutoff and tests the next `horizon` days
+N_FOLDS = 5
+HORIZON = 28                     # must stay <= the 365-day lags so test features never see test targets (check_horizon)
+MODELS = ("prophet", "lightgbm", "xgboost")
+
+
+def check_horizon(horizon, pipeline=None):
+    # One feature matrix serves every fold only while test targets can't reach the lags or rolling windows
+    limit = (pipeline or FeaturePipeline()).max_horizon
+    if limit is not None and horizon > limit:
+        raise ValueError(f"❌ El horizonte ({horizon} días) no puede superar el rezago más corto de las features ({limit} días)")
+
+
+def make_cutoffs(df, n_folds=N_FOLDS, horizon=HORIZON):
+    last = df["ds"].max()
+    return [last - pd.Timedelta(days=horizon * k) for k in range(n_folds, 0, -1)]
+
+
+def project_table():
+    # The project's single series (sales + external factors) as a one-series long table
+    df = load_history()
+    df[SERIES_COL] = "total"
+    return df.sort_values([SERIES_COL, "ds"], ignore_index=True)
+
+
+# 📌 LightGBM / XGBoost: one feature matrix for all folds, folds fitted on threads (boosting releases the GIL)
+def backtest_tree(df, kind, cutoffs, horizon=HORIZON, max_workers=None, params=None):
+    exog_cols = exogenous_columns(df)
+    categories = np.sort(df[SERIES_COL].unique())
+    ds = df["ds"].to_numpy()
+    y = df["y"].to_numpy(dtype=np.float64)
+    observed = ~np.isnan(y)
+
+    # ✅ Lags and rolling means only look >= 365 days back, so features built once over the whole table
+    # are identical to per-fold rebuilds; fill statistics come from rows before the first cutoff only
+    pipeline = FeaturePipeline(exogenous=exog_cols).fit(df[ds <= np.datetime64(cutoffs[0])])
+    check_horizon(horizon, pipeline)
+    X = tree_matrix(pipeline, df, categories)
+
+    workers = max(1, min(max_workers or os.cpu_count(), len(cutoffs)))
+    threads = max(1, os.cpu_count() // workers)
+
+    def run_fold(fold, cutoff):
+        start = time.perf_counter()
+        cutoff = np.datetime64(cutoff)
+        train = observed & (ds <= cutoff)
+        test = observed & (ds > cutoff) & (ds <= cutoff + np.timedelta64(horizon, "D"))
+        model = tree_model(kind, threads, params)
+        model.fit(X[train], y[train])
+        predictions = df.loc[test, [SERIES_COL, "ds", "y"]].reset_index(drop=True)
+        predictions["yhat"] = model.predict(X[test])
+        return predictions.assign(model=kind, fold=fold), time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run_fold, range(len(cutoffs)), cutoffs))
+    predictions = pd.concat([frame for frame, _ in results], ignore_index=True)
+    timings = pd.DataFrame({"model": kind, "fold": range(len(cutoffs)), "seconds": [seconds for _, seconds in results]})
+    return predictions, timings
+
+
+# 📌 Prophet: one fit per (series, fold), spread over a process pool
+def _fit_predict_prophet_fold(task):
+    fold, inner = task
+    forecast, timing = fit_predict_prophet(inner)
+    return forecast.assign(fold=fold), timing["fit_seconds"] + timing["predict_seconds"]
+
+
+def backtest_prophet(df, cutoffs, horizon=HORIZON, max_workers=None):
+    exog_cols = exogenous_columns(df)
+    tasks = []
+    for series_id, group in df.groupby(SERIES_COL, sort=False, observed=True):
+        group = group.drop(columns=SERIES_COL)
+        for fold, cutoff in enumerate(cutoffs):
+            history = group[group["ds"] <= cutoff]
+            future = group[(group["ds"] > cutoff) & (group["ds"] <= cutoff + pd.Timedelta(days=horizon))]
+            if len(history.dropna(subset=["y"])) >= 2 and len(future):
+                # Backtests use the realised exogenous values; gaps fall back to the training mean
+                future = future[["ds", *exog_cols]].fillna(history[exog_cols].mean())
+                tasks.append((fold, (series_id, history, future, exog_cols)))
+
+    max_workers = max_workers or os.cpu_count()
+    chunksize = max(1, len(tasks) // (max_workers * 4))
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_prophet_worker) as executor:
+        results = list(executor.map(_fit_predict_prophet_fold, tasks, chunksize=chunksize))
+
+    forecast = pd.concat([frame for frame, _ in results], ignore_index=True)
+    predictions = forecast[[SERIES_COL, "ds", "fold", "yhat"]].merge(df[[SERIES_COL, "ds", "y"]], on=[SERIES_COL, "ds"])
+    predictions = predictions.dropna(subset=["y"]).assign(model="prophet")
+    # Folds interleave in the pool, so a fold's time is the summed fit + predict time of its series
+    seconds = pd.Series([seconds for _, seconds in results]).groupby([fold for fold, _ in tasks]).sum()
+    timings = pd.DataFrame({"model": "prophet", "fold": seconds.index, "seconds": seconds.to_numpy()})
+    return predictions, timings
+
+
+# 📌 Metrics: vectorized group-bys, so scoring thousands of series is one pass over the predictions
+def score(predictions, by):
+    error = predictions["yhat"].to_numpy() - predictions["y"].to_numpy()
+    actual = np.abs(predictions["y"].to_numpy())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ape = np.where(actual > 0, np.abs(error) / actual, np.nan)
+    grouped = predictions[by].assign(error=error, abs_error=np.abs(error), abs_actual=actual, ape=ape).groupby(by, observed=True)
+    metrics = grouped.agg(rows=("ape", "size"), mape=("ape", "mean"), error=("error", "sum"),
+                          abs_error=("abs_error", "sum"), abs_actual=("abs_actual", "sum"))
+    metrics["wape"] = metrics["abs_error"] / metrics["abs_actual"]
+    # Positive bias = over-forecast, as a share of actual volume
+    metrics["bias"] = metrics["error"] / metrics["abs_actual"]
+    return metrics.drop(columns=["error", "abs_error", "abs_actual"]).reset_index()
+
+
+def best_models(series_metrics):
+    # Lowest WAPE across all folds, per series
+    ranked = series_metrics.sort_values([SERIES_COL, "wape"], kind="stable")
+    return ranked.drop_duplicates(SERIES_COL)[[SERIES_COL, "model", "wape", "mape", "bias"]].reset_index(drop=True)
+
+
+def run_backtest(df, models=MODELS, n_folds=N_FOLDS, horizon=HORIZON, max_workers=None):
+    check_horizon(horizon)
+    cutoffs = make_cutoffs(df, n_folds, horizon)
+    predictions, timings = [], []
+    for kind in models:
+        if kind == "prophet":
+            prediction, timing = backtest_prophet(df, cutoffs, horizon, max_workers)
+        else:
+            prediction, timing = backtest_tree(df, kind, cutoffs, horizon, max_workers)
+        predictions.append(prediction)
+        timings.append(timing)
+    predictions = pd.concat(predictions, ignore_index=True)[["model", "fold", SERIES_COL, "ds", "y", "yhat"]]
+
+    metrics = score(predictions, ["model", "fold"]).merge(pd.concat(timings, ignore_index=True), on=["model", "fold"])
+    metrics.insert(2, "cutoff", [cutoffs[fold].date() for fold in metrics["fold"]])
+    series_metrics = score(predictions, ["model", SERIES_COL])
+    return predictions, metrics, series_metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtesting con origen móvil (ventana expansiva) y comparación de modelos.")
+    parser.add_argument("input", nargs="?", help="CSV en formato largo (series_id, ds, y, exógenas); por defecto los datos del proyecto")
+    parser.add_argument("--models", nargs="+", default=list(MODELS), choices=list(MODELS))
+    parser.add_argument("--folds", type=int, default=N_FOLDS)
+    parser.add_argument("--horizon", type=int, default=HORIZON)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+    try:
+        check_horizon(args.horizon)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    df = load_long_table(args.input) if args.input else project_table()
+    print(f"🔄 Backtesting de {df[SERIES_COL].nunique()} series, {args.folds} cortes de {args.horizon} días: {', '.join(args.models)}...")
+    started = time.perf_counter()
+    predictions, metrics, series_metrics = run_backtest(df, args.models, args.folds, args.horizon, args.workers)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    predictions.to_csv(os.path.join(args.output_dir, "backtest_predictions.csv"), index=False)
+    metrics.to_csv(os.path.join(args.output_dir, os.path.basename(METRICS_PATH)), index=False)
+    series_metrics.to_csv(os.path.join(args.output_dir, "backtest_series_metrics.csv"), index=False)
+    best_models(series_metrics).to_csv(os.path.join(args.output_dir, "best_models.csv"), index=False)
+
+    summary = metrics.groupby("model")[["mape", "wape", "bias", "seconds"]].mean()
+    print(summary.round(4).to_string())
+    print(f"✅ Backtesting completado en {time.perf_counter() - started:.1f}s; resultados en: {args.output_dir}")
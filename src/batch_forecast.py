@@ -0,0 +1,231 @@
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from features import FeaturePipeline
+from instrumentation import stage
+from intervals import calibrate_tree, prophet_forecast, tree_intervals
+
+# Get Paths
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_DIR = os.path.join(BASE_DIR, "data", "batch")
+
+# 📌 Long-format schema: one row per (series_id, ds) with target `y` and optional exogenous columns
+SERIES_COL = "series_id"
+TREE_PARAMS = {"n_estimators": 100, "learning_rate": 0.1, "max_depth": 5}
+PROPHET_PARAMS = {"yearly_seasonality": True, "weekly_seasonality": False, "changepoint_prior_scale": 0.05}
+
+
+def load_long_table(path, series_id="total"):
+    df = pd.read_csv(path)
+    # ✅ Accept the single-series project CSV (Date, Sales_Volume) as a one-series long table
+    df = df.rename(columns={"Date": "ds", "Sales_Volume": "y"})
+    if SERIES_COL not in df.columns:
+        df[SERIES_COL] = series_id
+    df["ds"] = pd.to_datetime(df["ds"])
+    df[SERIES_COL] = df[SERIES_COL].astype(str)
+    return df.sort_values([SERIES_COL, "ds"], ignore_index=True)
+
+
+def exogenous_columns(df):
+    return [c for c in df.columns if c not in (SERIES_COL, "ds", "y")]
+
+
+def future_frame(df, horizon, future_exog=None):
+    # ✅ Horizon rows for every series, starting the day after each series' last observation
+    exog_cols = exogenous_columns(df)
+    last = df.groupby(SERIES_COL, sort=True)["ds"].max()
+    offsets = pd.to_timedelta(np.tile(np.arange(1, horizon + 1), len(last)), unit="D")
+    future = pd.DataFrame({
+        SERIES_COL: np.repeat(last.index.to_numpy(), horizon),
+        "ds": np.repeat(last.to_numpy(), horizon) + offsets,
+    })
+    if not exog_cols:
+        return future
+    if future_exog is not None:
+        future = future.merge(future_exog[[SERIES_COL, "ds", *exog_cols]], on=[SERIES_COL, "ds"], how="left")
+    else:
+        for col in exog_cols:
+            future[col] = np.nan
+    # ✅ Missing future exogenous values fall back to each series' historical mean
+    means = df.groupby(SERIES_COL)[exog_cols].mean()
+    filled = future[[SERIES_COL]].join(means, on=SERIES_COL)
+    future[exog_cols] = future[exog_cols].fillna(filled[exog_cols])
+    return future
+
+
+# 📌 Prophet: one model per series, fitted in a process pool
+def init_prophet_worker():
+    # ✅ Import Prophet once per worker (not once per series) and silence Stan's chatter
+    import prophet  # noqa: F401
+
+    # cmdstanpy installs its own INFO handler lazily unless one is already attached
+    logging.getLogger("cmdstanpy").addHandler(logging.NullHandler())
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    logging.getLogger("prophet").setLevel(logging.WARNING)
+
+
+def fit_predict_prophet(task):
+    from prophet import Prophet
+
+    series_id, history, future, exog_cols = task
+    start = time.perf_counter()
+    model = Prophet(**PROPHET_PARAMS)
+    for col in exog_cols:
+        model.add_regressor(col)
+    history = history.dropna(subset=["y"])
+    if len(history) < 2:
+        raise ValueError(f"❌ La serie {series_id} tiene menos de 2 observaciones")
+    empty = [col for col in exog_cols if history[col].isna().all()]
+    if empty:
+        raise ValueError(f"❌ La serie {series_id} no tiene valores de {', '.join(empty)}")
+    history[exog_cols] = history[exog_cols].fillna(history[exog_cols].mean())
+    model.fit(history)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    forecast = prophet_forecast(model, future)
+    predict_seconds = time.perf_counter() - start
+
+    forecast.insert(0, SERIES_COL, series_id)
+    timing = {SERIES_COL: series_id, "model": "prophet", "rows": len(history), "fit_seconds": fit_seconds, "predict_seconds": predict_seconds}
+    return forecast, timing
+
+
+def fit_predict_prophet_or_skip(task):
+    # ✅ A series Prophet can't fit (too short, a regressor without values, Stan failure) is skipped and reported
+    # in the timings table instead of aborting every other series in the pool
+    try:
+        forecast, timing = fit_predict_prophet(task)
+        return forecast, {**timing, "error": None}
+    except Exception as exc:
+        series_id, history = task[0], task[1]
+        rows = int(history["y"].notna().sum())
+        return None, {SERIES_COL: series_id, "model": "prophet", "rows": rows, "fit_seconds": np.nan, "predict_seconds": np.nan, "error": str(exc)}
+
+
+def forecast_prophet(df, horizon, future_exog=None, max_workers=None):
+    exog_cols = exogenous_columns(df)
+    future = future_frame(df, horizon, future_exog)
+    history_groups = dict(tuple(df.groupby(SERIES_COL, sort=False)))
+    tasks = [
+        (series_id, history_groups[series_id].drop(columns=SERIES_COL), frame.drop(columns=SERIES_COL), exog_cols)
+        for series_id, frame in future.groupby(SERIES_COL, sort=False)
+    ]
+
+    max_workers = max_workers or os.cpu_count()
+    chunksize = max(1, len(tasks) // (max_workers * 4))
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_prophet_worker) as executor:
+        results = list(executor.map(fit_predict_prophet_or_skip, tasks, chunksize=chunksize))
+
+    forecasts = [forecast for forecast, _ in results if forecast is not None]
+    timings = [timing for _, timing in results]
+    forecast = pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame(columns=[SERIES_COL, "ds", "yhat", "yhat_lower", "yhat_upper"])
+    forecast["model"] = "prophet"
+    return forecast, pd.DataFrame(timings)
+
+
+# 📌 LightGBM / XGBoost: one pooled global model with the series id as a categorical feature
+def tree_matrix(pipeline, frame, categories):
+    # `frame` holds history and future rows sorted by series and date, so lags see each series' past
+    X = pipeline.transform(frame, series_col=SERIES_COL)
+    X[SERIES_COL] = pd.Categorical(frame[SERIES_COL].to_numpy(), categories=categories)
+    return X
+
+
+def tree_model(kind, n_jobs=None, params=None):
+    # `n_jobs` caps the threads per model when several models are fitted side by side; `params` are tuned
+    # hyperparameters (src/tuning.py) replacing TREE_PARAMS
+    threads = {"n_jobs": n_jobs} if n_jobs else {}
+    params = params or TREE_PARAMS
+    if kind == "lightgbm":
+        import lightgbm as lgb
+        return lgb.LGBMRegressor(**params, verbose=-1, **threads)
+    if kind == "xgboost":
+        import xgboost as xgb
+        return xgb.XGBRegressor(**params, tree_method="hist", enable_categorical=True, **threads)
+    raise ValueError(f"❌ Modelo no soportado: {kind}")
+
+
+def forecast_global(df, horizon, kind="lightgbm", future_exog=None, params=None):
+    exog_cols = exogenous_columns(df)
+    history = df.dropna(subset=["y"])
+    categories = np.sort(df[SERIES_COL].unique())
+
+    start = time.perf_counter()
+    future = future_frame(df, horizon, future_exog)
+    frame = pd.concat([df.assign(is_future=False), future.assign(is_future=True)], ignore_index=True)
+    frame = frame.sort_values([SERIES_COL, "ds"], kind="stable", ignore_index=True)
+    pipeline = FeaturePipeline(exogenous=exog_cols).fit(history)
+    X = tree_matrix(pipeline, frame, categories)
+    is_future = frame["is_future"].to_numpy()
+    train = ~is_future & frame["y"].notna().to_numpy()
+    model = tree_model(kind, params=params)
+    with stage("fit"):
+        model.fit(X[train], frame.loc[train, "y"].to_numpy())
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    forecast = frame.loc[is_future, [SERIES_COL, "ds"]].reset_index(drop=True)
+    with stage("predict"):
+        forecast["yhat"] = model.predict(X[is_future])
+    predict_seconds = time.perf_counter() - start
+
+    # ✅ Per-series rows share the pooled fit/predict cost proportionally to their row counts
+    rows = history.groupby(SERIES_COL).size()
+    timings = pd.DataFrame({
+        SERIES_COL: rows.index,
+        "model": kind,
+        "rows": rows.to_numpy(),
+        "fit_seconds": fit_seconds * rows.to_numpy() / rows.sum(),
+        "predict_seconds": predict_seconds / len(rows),
+    })
+    # ✅ Conformal band from rolling-origin backtest residuals of the same model and parameters, pooled over series
+    with stage("calibrate"):
+        calibration = calibrate_tree(kind, df, params=params)
+    forecast["yhat_lower"], forecast["yhat_upper"] = tree_intervals(forecast["yhat"].to_numpy(), calibration)
+    forecast["model"] = kind
+    return forecast, timings
+
+
+def run_batch(df, models=("prophet", "lightgbm", "xgboost"), horizon=90, future_exog=None, max_workers=None):
+    forecasts, timings = [], []
+    for kind in models:
+        if kind == "prophet":
+            forecast, timing = forecast_prophet(df, horizon, future_exog, max_workers)
+        else:
+            forecast, timing = forecast_global(df, horizon, kind, future_exog)
+        forecasts.append(forecast)
+        timings.append(timing)
+    columns = [SERIES_COL, "model", "ds", "yhat", "yhat_lower", "yhat_upper"]
+    forecast = pd.concat(forecasts, ignore_index=True)[columns]
+    return forecast, pd.concat(timings, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pronóstico por lotes para múltiples series (SKU × región).")
+    parser.add_argument("input", help="CSV en formato largo: series_id, ds, y y columnas exógenas")
+    parser.add_argument("--future-exog", help="CSV opcional con series_id, ds y valores exógenos futuros")
+    parser.add_argument("--models", nargs="+", default=["prophet", "lightgbm", "xgboost"], choices=["prophet", "lightgbm", "xgboost"])
+    parser.add_argument("--horizon", type=int, default=90)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    df = load_long_table(args.input)
+    future_exog = load_long_table(args.future_exog) if args.future_exog else None
+    print(f"🔄 Pronosticando {df[SERIES_COL].nunique()} series con {', '.join(args.models)}...")
+
+    forecast, timings = run_batch(df, args.models, args.horizon, future_exog, args.workers)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    forecast.to_csv(os.path.join(args.output_dir, "batch_forecast.csv"), index=False)
+    timings.to_csv(os.path.join(args.output_dir, "batch_timings.csv"), index=False)
+    if "error" in timings.columns and timings["error"].notna().any():
+        print(f"⚠ {int(timings['error'].notna().sum())} series omitidas (ver columna error de batch_timings.csv)")
+    print(f"✅ Pronóstico por lotes guardado en: {args.output_dir}")
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from batch_forecast import SERIES_COL, forecast_global, forecast_prophet
+from dataset_store import load_seasonality
+from features import FeaturePipeline
+from ingest import ingest_sales
+
+# Get Paths
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+REPORT_DIR = os.path.join(BASE_DIR, "data", "benchmarks")
+
+# 📌 Benchmark Sizes (series × days) and Stages
+DEFAULT_SIZES = ("10x730", "100x730", "1000x730")
+DEFAULT_MODELS = ("lightgbm", "xgboost")
+START_DATE = "2023-01-01"
+MISSING_RATE = 0.02
+HORIZON = 90
+REGRESSION_THRESHOLD = 1.2       # flag stages that got 20% slower (or bigger) than the baseline report
+
+# 📌 Import-Time Benchmark: each entry point is imported in a fresh interpreter; model libraries it must not pull in
+# (Prophet/Stan for tree inference, any backend before a model is chosen) are reported as violations
+MODEL_LIBRARIES = ("prophet", "cmdstanpy", "lightgbm", "xgboost", "sklearn")
+IMPORT_TARGETS = {
+    "model_registry": ("model_registry", ("pandas", *MODEL_LIBRARIES)),
+    "predict": ("forecast_cache", (*MODEL_LIBRARIES, "plotly", "scipy")),
+    "serving": ("serving", (*MODEL_LIBRARIES, "plotly", "scipy")),
+    "dashboard": ("charts, dataset_store, forecast_cache, instrumentation, model_registry, scenarios, training_jobs", (*MODEL_LIBRARIES, "scipy")),
+}
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {modules}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "loaded": sorted(m for m in {forbidden!r} if m in sys.modules)}}))
+"""
+
+
+def generate_long_table(n_series, n_days, seed=42, missing_rate=MISSING_RATE, start=START_DATE):
+    # ✅ Vectorized synthetic panel: (series × day) arrays, no per-row Python
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start=start, periods=n_days, freq="D")
+    seasonality = load_seasonality().set_index("Month")["Seasonality"].to_numpy(dtype=np.float64)
+    seasonality = seasonality / seasonality.max()
+
+    base = rng.lognormal(mean=np.log(250), sigma=0.6, size=(n_series, 1))
+    trend = rng.normal(0, 0.0003, size=(n_series, 1)) * np.arange(n_days)
+    season = seasonality[dates.month.to_numpy() - 1]
+    temperature = 22 + 5 * np.sin(2 * np.pi * (dates.dayofyear.to_numpy() - 100) / 365.25) + rng.normal(0, 2, size=(n_series, n_days))
+    price = rng.uniform(18, 25, size=(n_series, 1)) * (1 + rng.normal(0, 0.03, size=(n_series, n_days)))
+    noise = rng.normal(0, 0.05, size=(n_series, n_days))
+    y = base * (1 + trend) * season * (1 + noise) * (1 - 0.01 * (price - 21.5))
+
+    df = pd.DataFrame({
+        SERIES_COL: np.repeat([f"S{i:06d}" for i in range(n_series)], n_days),
+        "ds": np.tile(dates.to_numpy(), n_series),
+        "y": np.round(y).ravel(),
+        "Temperature": temperature.ravel(),
+        "Price": price.ravel(),
+    })
+    # Missing days: dropped rows, like gaps in point-of-sale extracts
+    return df[rng.random(len(df)) >= missing_rate].reset_index(drop=True)
+
+
+def _measure(fn, memory):
+    if not memory:
+        start = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - start, None
+    # Traced in a separate run so tracemalloc's overhead never lands in the timings
+    tracemalloc.start()
+    try:
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, None, peak / 2**20
+
+
+def run_stage(fn, repeat=1, memory=True):
+    # Best-of-`repeat` wall clock, plus the peak Python/NumPy allocation of one traced run
+    runs = [_measure(fn, False) for _ in range(repeat)]
+    peak_mb = _measure(fn, True)[2] if memory else None
+    return runs[-1][0], min(seconds for _, seconds, _ in runs), peak_mb
+
+
+def benchmark_size(n_series, n_days, models=DEFAULT_MODELS, repeat=1, memory=True, seed=42):
+    df = generate_long_table(n_series, n_days, seed)
+    size = f"{n_series}x{n_days}"
+    results = []
+
+    def add(stage, model, seconds, peak_mb=None):
+        results.append({"size": size, "n_series": n_series, "n_days": n_days, "rows": len(df), "stage": stage, "model": model,
+                        "seconds": round(seconds, 4), "peak_mb": None if peak_mb is None else round(peak_mb, 2)})
+        print(f"⏱️ {size} {stage:<11} {model or '-':<9} {seconds:8.3f}s" + (f" {peak_mb:8.1f} MB" if peak_mb is not None else ""))
+
+    def record(stage, model, fn):
+        result, seconds, peak_mb = run_stage(fn, repeat, memory)
+        add(stage, model, seconds, peak_mb)
+        return result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "sales.csv")
+        df[[SERIES_COL, "ds", "y"]].to_csv(csv_path, index=False)
+        record("ingest", None, lambda: ingest_sales(csv_path, tmp, date_col="ds", value_col="y", series_cols=[SERIES_COL]))
+
+    record("features", None, lambda: FeaturePipeline().fit_transform(df, series_col=SERIES_COL))
+    for model in models:
+        if model == "prophet":
+            record("fit+predict", model, lambda: forecast_prophet(df, HORIZON))
+            continue
+        # forecast_global times fit and predict internally; they are reported next to the stage total
+        _, timings = record("fit+predict", model, lambda: forecast_global(df, HORIZON, model))
+        add("fit", model, float(timings["fit_seconds"].sum()))
+        add("predict", model, float(timings["predict_seconds"].sum()))
+    return results
+
+
+def benchmark_imports(targets=IMPORT_TARGETS, repeat=3):
+    # Best of `repeat` cold imports per entry point (a new process each time, so nothing is already in sys.modules)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), os.environ.get("PYTHONPATH")]))}
+    results, violations = [], []
+    for label, (modules, forbidden) in targets.items():
+        code = IMPORT_PROBE.format(modules=modules, forbidden=tuple(forbidden))
+        runs = [json.loads(subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout) for _ in range(repeat)]
+        seconds = min(run["seconds"] for run in runs)
+        loaded = runs[-1]["loaded"]
+        results.append({"size": "import", "n_series": 0, "n_days": 0, "rows": 0, "stage": "import", "model": label,
+                        "seconds": round(seconds, 4), "peak_mb": None})
+        print(f"⏱️ import {label:<15} {seconds:8.3f}s" + (f" ❌ importa {', '.join(loaded)}" if loaded else ""))
+        violations.extend((label, module) for module in loaded)
+    return results, violations
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(results, seed):
+    return {
+        "meta": {
+            "commit": _commit(),
+            "created_at": pd.Timestamp.now(tz="UTC").isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": seed,
+        },
+        "results": sorted(results, key=lambda r: (r["n_series"], r["n_days"], r["stage"], r["model"] or "")),
+    }
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    # Ratios against a baseline report for the same (size, stage, model); > threshold is a regression
+    previous = {(r["size"], r["stage"], r["model"]): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get((result["size"], result["stage"], result["model"]))
+        if old is None:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            if result[metric] is None or not old[metric]:
+                continue
+            ratio = result[metric] / old[metric]
+            flag = "❌" if ratio > threshold else "✅"
+            print(f"{flag} {result['size']} {result['stage']} {result['model'] or '-'} {metric}: {old[metric]} → {result[metric]} ({ratio:.2f}x)")
+            if ratio > threshold:
+                regressions.append((result["size"], result["stage"], result["model"], metric, ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta, features, entrenamiento y predicción con datos sintéticos.")
+    parser.add_argument("--sizes", nargs="*", default=list(DEFAULT_SIZES), help="Tamaños como SERIESxDIAS, p. ej. 100x730 (vacío: solo tiempos de importación)")
+    parser.add_argument("--models", nargs="+", default=list(DEFAULT_MODELS), choices=["prophet", "lightgbm", "xgboost"])
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones por etapa (se reporta la mejor)")
+    parser.add_argument("--no-memory", action="store_true", help="No medir memoria pico (evita la corrida con tracemalloc)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-imports", action="store_true", help="No medir el tiempo de importación de los puntos de entrada")
+    parser.add_argument("--output", help="Ruta del reporte JSON (por defecto data/benchmarks/benchmark-<commit>.json)")
+    parser.add_argument("--compare", help="Reporte base contra el cual detectar regresiones")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    results, violations = [], []
+    if not args.no_imports:
+        results, violations = benchmark_imports(repeat=max(args.repeat, 3))
+    for size in args.sizes:
+        n_series, n_days = (int(part) for part in size.lower().split("x"))
+        results.extend(benchmark_size(n_series, n_days, args.models, args.repeat, not args.no_memory, args.seed))
+
+    report = build_report(results, args.seed)
+    output = args.output or os.path.join(REPORT_DIR, f"benchmark-{report['meta']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"✅ Reporte guardado en: {output}")
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regresiones por encima de {args.threshold:.2f}x")
+    if violations:
+        print(f"❌ {len(violations)} librerías de modelos importadas donde no se usan: " + ", ".join(f"{label}→{module}" for label, module in violations))
+    if regressions or violations:
+        sys.exit(1)
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# 📌 Chart Budgets: the browser only ever receives about MAX_POINTS points per trace
+MAX_POINTS = 2000
+WEBGL_THRESHOLD = 1000           # above this many points a trace is drawn with WebGL (Scattergl)
+HISTORY_COLOR = "#0f4c75"
+FORECAST_COLOR = "#3282b8"
+BAND_COLOR = "rgba(50, 130, 200, 0.5)"
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and, per bucket, the point that forms
+    # the largest triangle with the previous pick and the next bucket's mean; returns positional indices
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, n_out):
+    # Min and max of each bucket (n_out / 2 buckets), so peaks and troughs survive; positional indices
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    buckets = np.arange(n) * (n_out // 2) // n
+    grouped = pd.Series(np.asarray(y, dtype=np.float64)).groupby(buckets)
+    return np.unique(np.concatenate([grouped.idxmin().to_numpy(), grouped.idxmax().to_numpy(), [0, n - 1]]))
+
+
+def downsample(df, columns, max_points=MAX_POINTS, method="lttb", start=None, end=None, x="ds"):
+    # ✅ Cut to the visible window first, then thin it: zooming into a shorter window gives more detail
+    if start is not None:
+        df = df[df[x] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df[x] <= pd.Timestamp(end)]
+    df = df.dropna(subset=list(columns)).reset_index(drop=True)
+    if len(df) <= max_points:
+        return df
+    if method == "lttb":
+        # One pick per bucket shared by every column, driven by the first
+        x_values = df[x].to_numpy(dtype="datetime64[ns]").astype(np.int64) if np.issubdtype(df[x].dtype, np.datetime64) else df[x]
+        index = lttb(x_values, df[columns[0]].to_numpy(), max_points)
+    elif method == "minmax":
+        # Each column gets its share of the budget; the union keeps the extremes of all of them
+        budget = max_points // len(columns)
+        index = np.unique(np.concatenate([minmax(df[col].to_numpy(), budget) for col in columns]))
+    else:
+        raise ValueError(f"❌ Método de reducción no soportado: {method}")
+    return df.iloc[index].reset_index(drop=True)
+
+
+def scatter(x, y, **kwargs):
+    # SVG below the threshold (crisper, supports every fill mode), WebGL above it
+    return (go.Scattergl if len(x) > WEBGL_THRESHOLD else go.Scatter)(x=x, y=y, **kwargs)
+
+
+def forecast_figure(history, forecast, label, max_points=MAX_POINTS, start=None, end=None):
+    # Figures are built once without a template and returned as plain dicts (cacheable, cheap to theme)
+    history = downsample(history, ["y"], max_points, "lttb", start, end)
+    fig = go.Figure()
+    fig.add_trace(scatter(history["ds"], history["y"], mode='markers', name="Ventas Históricas", marker=dict(color=HISTORY_COLOR, size=5)))
+    fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat'], mode='lines', name=f"Pronóstico ({label})", line=dict(color=FORECAST_COLOR, width=3)))
+    fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat_upper'], mode='lines', name="Límite Superior", line=dict(dash="dot", color=BAND_COLOR)))
+    fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat_lower'], mode='lines', name="Límite Inferior", line=dict(dash="dot", color=BAND_COLOR), fill='tonexty'))
+    fig.update_layout(title="📈 Pronóstico de Ventas (Pasado + Futuro Sin Cortes)", xaxis_title="Fecha", yaxis_title="Ventas (litros)", xaxis=dict(rangeslider=dict(visible=True), type="date"), yaxis=dict(fixedrange=False))
+    return fig.to_dict()
+
+
+def external_figure(df, max_points=MAX_POINTS, start=None, end=None):
+    external = downsample(df[["ds", "Temperature", "Price"]], ["Temperature", "Price"], max_points, "minmax", start, end)
+    fig = go.Figure()
+    fig.add_trace(scatter(external["ds"], external["Temperature"], mode='lines', name="Temperatura", line=dict(color="red")))
+    fig.add_trace(scatter(external["ds"], external["Price"], mode='lines', name="Precio", line=dict(color="green")))
+    fig.update_layout(title="Variación de Temperatura y Precio", xaxis_title="Fecha")
+    return fig.to_dict()
+
+
+def themed(figure, theme):
+    # ✅ A theme toggle only swaps the layout's template name; traces are reused as they are
+    return {**figure, "layout": {**figure.get("layout", {}), "template": theme}}
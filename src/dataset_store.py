@@ -0,0 +1,239 @@
+import argparse
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from ingest import DEFAULT_SERIES, EXOGENOUS_COLUMNS, EXTERNAL_CSV_PATH, SALES_CSV_PATH, SERIES_COL, read_store, store_exists, table_dir
+from instrumentation import stage, timed
+
+# Get Paths
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SEASONALITY_CSV_PATH = os.path.join(BASE_DIR, "data", "dairy_seasonality.csv")
+ARROW_DIR = os.path.join(BASE_DIR, "data", "arrow")
+# Written by src/backtest.py; defined here so the dashboard reads it without importing the backtest stack
+BACKTEST_DIR = os.path.join(BASE_DIR, "data", "backtest")
+BACKTEST_METRICS_PATH = os.path.join(BACKTEST_DIR, "backtest_metrics.csv")
+
+# 📌 Tables kept as typed Arrow IPC files; the CSVs remain the import sources
+TABLES = {
+    "sales": {"csv": SALES_CSV_PATH, "rename": {"Date": "ds", "Sales_Volume": "y"}, "dtypes": {"y": "int32"}, "date": "ds"},
+    "external": {"csv": EXTERNAL_CSV_PATH, "rename": {"Date": "ds"}, "dtypes": {col: "float32" for col in EXOGENOUS_COLUMNS}, "date": "ds"},
+    "seasonality": {"csv": SEASONALITY_CSV_PATH, "rename": {}, "dtypes": {"Month": "int8", "Seasonality": "float32"}, "date": None},
+}
+BATCH_ROWS = 64 * 1024
+
+
+def arrow_path(name, arrow_dir=ARROW_DIR):
+    return os.path.join(arrow_dir, f"{name}.arrow")
+
+
+def arrow_exists(name, arrow_dir=ARROW_DIR):
+    return os.path.exists(arrow_path(name, arrow_dir))
+
+
+def _source_paths(name):
+    # Files the Arrow copy was converted from: the Parquet store when it exists, otherwise the project CSV
+    paths = glob.glob(os.path.join(table_dir(name), "year=*", "*.parquet")) if name != "seasonality" else []
+    return paths or [TABLES[name]["csv"]]
+
+
+_stale_reported = set()
+
+
+def arrow_current(name, arrow_dir=ARROW_DIR):
+    # ✅ The Arrow file is used only while it is at least as new as its source; after a new ingest or an edited CSV
+    # the loaders fall back to the source until `convert` is run again
+    if not arrow_exists(name, arrow_dir):
+        return False
+    arrow_mtime = os.stat(arrow_path(name, arrow_dir)).st_mtime_ns
+    source_mtimes = [os.stat(p).st_mtime_ns for p in _source_paths(name) if os.path.exists(p)]
+    if source_mtimes and max(source_mtimes) > arrow_mtime:
+        if name not in _stale_reported:
+            _stale_reported.add(name)
+            print(f"⚠ {arrow_path(name, arrow_dir)} es anterior a su origen; se lee el origen (python src/dataset_store.py convert {name}).")
+        return False
+    return True
+
+
+def _read_source(name, source):
+    spec = TABLES[name]
+    if source is None and name != "seasonality" and store_exists(name):
+        return read_store(name)
+    df = pd.read_csv(source or spec["csv"]).rename(columns=spec["rename"])
+    if spec["date"]:
+        df[spec["date"]] = pd.to_datetime(df[spec["date"]])
+    return df
+
+
+def convert(name, source=None, arrow_dir=ARROW_DIR):
+    import pyarrow as pa
+
+    spec = TABLES[name]
+    df = _read_source(name, source)
+    for col, dtype in spec["dtypes"].items():
+        if col in df.columns:
+            # Integer volumes with gaps are kept as float32 rather than failing the cast
+            df[col] = df[col].astype("float32" if dtype.startswith("int") and df[col].isna().any() else dtype)
+    if SERIES_COL in df.columns:
+        df[SERIES_COL] = df[SERIES_COL].astype("category")
+    if spec["date"]:
+        # ✅ Sorted by date so range predicates become two binary searches over the mapped column
+        df = df.sort_values([spec["date"], *([SERIES_COL] if SERIES_COL in df.columns else [])], kind="stable", ignore_index=True)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    os.makedirs(arrow_dir, exist_ok=True)
+    target = arrow_path(name, arrow_dir)
+    tmp_path = f"{target}.tmp"
+    # Uncompressed IPC so readers can memory-map the buffers; os.replace keeps readers off half-written files
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=BATCH_ROWS)
+    os.replace(tmp_path, target)
+    return len(df)
+
+
+def _search(column, value, side):
+    # Binary search over a sorted, chunked timestamp column without combining (copying) chunks
+    offset = 0
+    for chunk in column.chunks:
+        values = chunk.to_numpy(zero_copy_only=True)
+        if len(values) and (values[-1] > value if side == "right" else values[-1] >= value):
+            return offset + int(np.searchsorted(values, value, side="left" if side == "left" else "right"))
+        offset += len(values)
+    return offset
+
+
+def load_table(name, columns=None, start=None, end=None, arrow_dir=ARROW_DIR):
+    import pyarrow as pa
+
+    # ✅ Zero-copy read: the table's buffers point into the memory-mapped file
+    table = pa.ipc.open_file(pa.memory_map(arrow_path(name, arrow_dir), "r")).read_all()
+    date_col = TABLES[name]["date"]
+    if date_col and (start is not None or end is not None):
+        column = table.column(date_col)
+        unit = column.type.unit
+        lo = _search(column, np.datetime64(pd.Timestamp(start), unit), "left") if start is not None else 0
+        hi = _search(column, np.datetime64(pd.Timestamp(end), unit), "right") if end is not None else len(table)
+        table = table.slice(lo, max(hi - lo, 0))
+    if columns:
+        table = table.select(list(columns))
+    return table
+
+
+def load_frame(name, columns=None, start=None, end=None, arrow_dir=ARROW_DIR):
+    return load_table(name, columns, start, end, arrow_dir).to_pandas()
+
+
+def _between(df, start, end):
+    if start is not None:
+        df = df[df["ds"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["ds"] <= pd.Timestamp(end)]
+    return df.reset_index(drop=True)
+
+
+def source_signature(name, csv_path=None):
+    # Cheap change detector (mtime + size) for whichever source load_* will read
+    if arrow_current(name):
+        paths = [arrow_path(name)]
+    else:
+        paths = glob.glob(os.path.join(table_dir(name), "year=*", "*.parquet")) or [csv_path or TABLES[name]["csv"]]
+    stats = [os.stat(p) for p in paths if os.path.exists(p)]
+    if not stats:
+        return None
+    return (len(stats), max(s.st_mtime_ns for s in stats), sum(s.st_size for s in stats))
+
+
+def _read_sales(columns, start, end):
+    if arrow_current("sales"):
+        names = load_table("sales").schema.names
+        wanted = [*columns, *([SERIES_COL] if SERIES_COL in names and SERIES_COL not in columns else [])]
+        return load_frame("sales", wanted, start, end)
+    wanted = [*columns, *([SERIES_COL] if SERIES_COL not in columns else [])]
+    return read_store("sales", columns=wanted, start=start, end=end)
+
+
+@timed("load.sales")
+def load_sales(series_id=None, columns=None, start=None, end=None):
+    columns = list(columns) if columns else ["ds", "y"]
+    if arrow_current("sales") or store_exists("sales"):
+        df = _read_sales(columns, start, end)
+        if SERIES_COL not in df.columns:
+            return _single_series(df, series_id)
+        if SERIES_COL not in columns:
+            if series_id is not None:
+                df = df[df[SERIES_COL] == series_id]
+            # ✅ Without a series id the single-series scripts model the aggregate of every series
+            df = df.groupby("ds", sort=True)[[c for c in columns if c != "ds"]].sum().reset_index()
+        return df
+    if not os.path.exists(SALES_CSV_PATH):
+        raise FileNotFoundError(f"❌ No se encontró el archivo de datos: {SALES_CSV_PATH}")
+    df = pd.read_csv(SALES_CSV_PATH, parse_dates=["Date"]).rename(columns=TABLES["sales"]["rename"])
+    return _single_series(_between(df, start, end)[columns], series_id)
+
+
+def _single_series(df, series_id):
+    # Only for sources without a series column: they hold just the default series, so any other id has no rows,
+    # like an unknown id in a multi-series table, instead of silently getting the aggregate
+    if series_id is None or str(series_id) == DEFAULT_SERIES:
+        return df
+    return df.iloc[0:0]
+
+
+def series_ids():
+    # Distinct series in the sales table; empty for the single-series project CSV
+    if arrow_current("sales"):
+        table = load_table("sales")
+        if SERIES_COL not in table.schema.names:
+            return []
+        return sorted(str(value) for value in table.column(SERIES_COL).unique().to_pylist())
+    if store_exists("sales"):
+        return sorted(str(value) for value in read_store("sales", columns=[SERIES_COL])[SERIES_COL].unique())
+    return []
+
+
+@timed("load.external")
+def load_external(columns=None, start=None, end=None):
+    if arrow_current("external"):
+        return load_frame("external", columns, start, end)
+    if store_exists("external"):
+        return read_store("external", columns=columns, start=start, end=end)
+    if not os.path.exists(EXTERNAL_CSV_PATH):
+        return None
+    external_df = pd.read_csv(EXTERNAL_CSV_PATH).rename(columns=TABLES["external"]["rename"])
+    external_df["ds"] = pd.to_datetime(external_df["ds"])
+    external_df = _between(external_df, start, end)
+    return external_df[columns] if columns else external_df
+
+
+def load_seasonality():
+    return load_frame("seasonality") if arrow_current("seasonality") else pd.read_csv(SEASONALITY_CSV_PATH)
+
+
+def load_history(sales=None, series_id=None, start=None, end=None):
+    df = load_sales(series_id, start=start, end=end) if sales is None else sales
+    external_df = load_external(start=start, end=end)
+    if external_df is not None and {"ds", *EXOGENOUS_COLUMNS}.issubset(external_df.columns):
+        with stage("merge"):
+            df = df.merge(external_df[["ds", *EXOGENOUS_COLUMNS]], on="ds", how="left")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convierte las tablas de data/ a archivos Arrow tipados y mapeables en memoria.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert")
+    convert_parser.add_argument("tables", nargs="*", default=list(TABLES), help=f"Tablas a convertir: {', '.join(TABLES)}")
+    convert_parser.add_argument("--source", help="CSV de origen (solo con una tabla); por defecto el almacén Parquet o el CSV del proyecto")
+    convert_parser.add_argument("--arrow-dir", default=ARROW_DIR)
+    args = parser.parse_args()
+
+    unknown = [name for name in args.tables if name not in TABLES]
+    if unknown:
+        parser.error(f"tablas desconocidas: {', '.join(unknown)}")
+    if args.source and len(args.tables) != 1:
+        parser.error("--source requiere exactamente una tabla")
+    for name in args.tables:
+        rows = convert(name, args.source, args.arrow_dir)
+        print(f"✅ {name}: {rows} filas → {arrow_path(name, args.arrow_dir)}")
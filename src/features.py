@@ -0,0 +1,228 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+# 📌 Feature Set Shared by Training Scripts, the Batch Engine and the Dashboard
+CALENDAR_FEATURES = ["year", "month", "day", "day_of_week"]
+EXOGENOUS_FEATURES = ["Temperature", "Price"]
+
+# ✅ Lags are at least the longest dashboard horizon (365 days), so every future row
+# is built from observed history and no recursive prediction is needed.
+DEFAULT_LAGS = (365,)
+DEFAULT_WINDOWS = (7, 28)
+DEFAULT_WINDOW_SHIFT = 365
+
+# 📌 Mexican national holidays and consumption peaks (month, day); Semana Santa is computed from Easter
+FIXED_HOLIDAYS = [(1, 1), (2, 5), (3, 21), (5, 1), (9, 16), (11, 2), (11, 20), (12, 12), (12, 24), (12, 25), (12, 31)]
+
+
+def to_days(dates):
+    return np.asarray(pd.DatetimeIndex(dates).values, dtype="datetime64[D]")
+
+
+def calendar_features(dates):
+    days = to_days(dates)
+    years = days.astype("datetime64[Y]")
+    months = days.astype("datetime64[M]")
+    return {
+        "year": (years.astype(np.int64) + 1970).astype(np.int32),
+        "month": ((months - years).astype(np.int64) + 1).astype(np.int32),
+        "day": ((days - months).astype(np.int64) + 1).astype(np.int32),
+        # 1970-01-01 was a Thursday; shift so Monday == 0 like pandas' dayofweek
+        "day_of_week": ((days.astype(np.int64) + 3) % 7).astype(np.int32),
+    }
+
+
+def easter_dates(years):
+    # Anonymous Gregorian algorithm, vectorized over an array of years
+    y = np.asarray(years, dtype=np.int64)
+    a, b, c = y % 19, y // 100, y % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    day = (h + l - 7 * m + 33 * month + 19) % 32
+    return (y - 1970).astype("datetime64[Y]").astype("datetime64[M]") + (month - 1) + np.timedelta64(0, "D") + (day - 1)
+
+
+def holiday_flags(dates):
+    days = to_days(dates)
+    calendar = calendar_features(days)
+    month_day = calendar["month"] * 100 + calendar["day"]
+    is_holiday = np.isin(month_day, [m * 100 + d for m, d in FIXED_HOLIDAYS])
+
+    # ✅ Semana Santa: Holy Thursday and Good Friday, one Easter computation per distinct year
+    years = np.unique(calendar["year"])
+    easter = easter_dates(years)
+    holy_week = np.concatenate([easter - np.timedelta64(3, "D"), easter - np.timedelta64(2, "D")])
+    is_holiday |= np.isin(days, holy_week)
+    return is_holiday.astype(np.int8)
+
+
+def daily_slots(groups, dates):
+    # Slot of each row on a complete daily calendar per series, so lags and windows count days, not rows: a missing
+    # day leaves an empty slot instead of shifting every later value. Returns (slots, day offset within the series,
+    # calendar size); rows may come in any order.
+    days = to_days(dates).astype(np.int64)
+    if len(days) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, 0
+    _, group_idx = np.unique(groups, return_inverse=True)
+    group_idx = group_idx.reshape(-1)
+    first = np.full(group_idx.max() + 1, np.iinfo(np.int64).max)
+    last = np.full(group_idx.max() + 1, np.iinfo(np.int64).min)
+    np.minimum.at(first, group_idx, days)
+    np.maximum.at(last, group_idx, days)
+    spans = last - first + 1
+    offsets = days - first[group_idx]
+    return np.r_[0, np.cumsum(spans)[:-1]][group_idx] + offsets, offsets, int(spans.sum())
+
+
+def lag_features(calendar, slots, offsets, lags):
+    # `calendar` holds the target on the daily grid of daily_slots (NaN on missing days)
+    out = {}
+    for lag in lags:
+        out[f"lag_{lag}"] = np.where(offsets >= lag, calendar[np.maximum(slots - lag, 0)], np.nan)
+    return out
+
+
+def rolling_means(calendar, slots, offsets, windows, shift):
+    # O(n) window sums from one cumulative sum over the daily grid; NaN targets (missing days, future rows) are skipped
+    valid = ~np.isnan(calendar)
+    sums = np.r_[0.0, np.cumsum(np.where(valid, calendar, 0.0))]
+    counts = np.r_[0, np.cumsum(valid)]
+    out = {}
+    for window in windows:
+        end = slots - shift + 1
+        start = end - window
+        ok = offsets >= shift + window - 1
+        total = np.where(ok, sums[np.clip(end, 0, None)] - sums[np.clip(start, 0, None)], np.nan)
+        count = np.where(ok, counts[np.clip(end, 0, None)] - counts[np.clip(start, 0, None)], 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[f"rolling_mean_{window}"] = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    return out
+
+
+class FeaturePipeline:
+    def __init__(self, exogenous=EXOGENOUS_FEATURES, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS,
+                 window_shift=DEFAULT_WINDOW_SHIFT, holidays=True):
+        self.exogenous = list(exogenous)
+        self.lags = tuple(int(lag) for lag in lags)
+        self.windows = tuple(int(window) for window in windows)
+        self.window_shift = int(window_shift)
+        self.holidays = bool(holidays)
+        self.fill_values = {}
+
+    @classmethod
+    def legacy(cls):
+        # Feature set of the models trained before this module existed
+        return cls(lags=(), windows=(), holidays=False)
+
+    @property
+    def feature_names(self):
+        names = list(CALENDAR_FEATURES) + self.exogenous
+        if self.holidays:
+            names.append("is_holiday")
+        names += [f"lag_{lag}" for lag in self.lags]
+        names += [f"rolling_mean_{window}" for window in self.windows]
+        return names
+
+    @property
+    def context_length(self):
+        # History days needed in front of the forecast window to compute lags/rolling means
+        spans = list(self.lags) + [self.window_shift + window - 1 for window in self.windows]
+        return max(spans, default=0)
+
+    @property
+    def max_horizon(self):
+        # Longest horizon whose targets never feed back into lags/rolling means of the same window (None = unbounded)
+        bounds = list(self.lags) + ([self.window_shift] if self.windows else [])
+        return min(bounds, default=None)
+
+    def fit(self, df):
+        # ✅ Fill statistics are computed once here and travel with the model
+        self.fill_values = {
+            col: float(df[col].mean()) if col in df.columns and df[col].notna().any() else 0.0
+            for col in self.exogenous
+        }
+        return self
+
+    @timed("features")
+    def transform(self, df, series_col=None):
+        features = calendar_features(df["ds"])
+        for col in self.exogenous:
+            values = df[col].to_numpy(dtype=np.float64) if col in df.columns else np.full(len(df), np.nan)
+            features[col] = np.where(np.isnan(values), self.fill_values.get(col, 0.0), values)
+        if self.holidays:
+            features["is_holiday"] = holiday_flags(df["ds"])
+
+        if self.lags or self.windows:
+            y = df["y"].to_numpy(dtype=np.float64) if "y" in df.columns else np.full(len(df), np.nan)
+            groups = df[series_col].to_numpy() if series_col else np.zeros(len(df), dtype=np.int8)
+            slots, offsets, size = daily_slots(groups, df["ds"])
+            calendar = np.full(size, np.nan)
+            calendar[slots] = y
+            features.update(lag_features(calendar, slots, offsets, self.lags))
+            features.update(rolling_means(calendar, slots, offsets, self.windows, self.window_shift))
+
+        return pd.DataFrame(features, index=df.index)[self.feature_names]
+
+    def fit_transform(self, df, series_col=None):
+        return self.fit(df).transform(df, series_col)
+
+    def future_features(self, history, days, exogenous=None):
+        # Future frame for the next `days` dates, built on the tail of `history` needed by the lags
+        future_dates = pd.date_range(start=history["ds"].max() + pd.Timedelta(days=1), periods=days, freq="D")
+        future = pd.DataFrame({"ds": future_dates})
+        for col, values in (exogenous or {}).items():
+            future[col] = values
+        # Context is cut by date, not row count, so gaps in the history don't shorten it
+        context = history[history["ds"] > history["ds"].max() - pd.Timedelta(days=self.context_length)]
+        frame = pd.concat([context, future], ignore_index=True)
+        X = self.transform(frame).iloc[len(context):].reset_index(drop=True)
+        return future_dates, X
+
+    def to_dict(self):
+        return {
+            "exogenous": self.exogenous,
+            "lags": list(self.lags),
+            "windows": list(self.windows),
+            "window_shift": self.window_shift,
+            "holidays": self.holidays,
+            "fill_values": self.fill_values,
+            "feature_names": self.feature_names,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        pipeline = cls(state["exogenous"], state["lags"], state["windows"], state["window_shift"], state["holidays"])
+        pipeline.fill_values = dict(state.get("fill_values", {}))
+        return pipeline
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def features_path(model_path):
+    return os.path.splitext(model_path)[0] + ".features.json"
+
+
+def load_model_features(model_path, history):
+    # ✅ Models saved before the shared pipeline have no sidecar: fall back to the legacy feature set
+    path = features_path(model_path)
+    if os.path.exists(path):
+        return FeaturePipeline.load(path)
+    return FeaturePipeline.legacy().fit(history)
@@ -0,0 +1,123 @@
+import argparse
+import functools
+import glob
+import hashlib
+import os
+import uuid
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from dataset_store import load_history, source_signature
+from instrumentation import stage, timed
+from intervals import prophet_forecast, tree_intervals
+from model_registry import BASE_DIR, MODELS, check_series, feature_pipeline, load_model, model_token, token_version
+
+# Get Paths
+FORECAST_DIR = os.path.join(BASE_DIR, "models", "forecasts")
+
+# 📌 One persisted forecast per (model version, series, data) at the longest horizon; shorter horizons are slices
+MAX_HORIZON = 365                # lags cover the longest horizon, so no recursive prediction is needed
+AGGREGATE = "__all__"
+CACHE_SIZE = 32
+COLUMNS = ["ds", "yhat", "yhat_lower", "yhat_upper"]
+
+
+def data_key():
+    # Cheap change detector for the project data (mtime + size of whatever load_history reads)
+    signatures = (source_signature("sales"), source_signature("external"))
+    return hashlib.sha256(repr(signatures).encode()).hexdigest()[:16]
+
+
+def cache_path(name, token, series_id, key, forecast_dir=FORECAST_DIR):
+    version = token.split(":", 1)[1].replace(":", "-")
+    series = AGGREGATE if series_id is None else quote(str(series_id), safe="")
+    return os.path.join(forecast_dir, name, f"{series}__{version}__{key}.parquet")
+
+
+def compute_forecast(name, history, horizon=MAX_HORIZON, model=None, metadata=None):
+    # Model inference for one history; used to fill the cache and for data that isn't the project's (uploads)
+    if model is None:
+        model, metadata = load_model(name)
+    if MODELS[name]["kind"] == "prophet":
+        future = pd.DataFrame({"ds": pd.date_range(start=history["ds"].max() + pd.Timedelta(days=1), periods=horizon, freq="D")})
+        with stage("predict"):
+            return prophet_forecast(model, future)[COLUMNS]
+
+    # ✅ Same features as training, with the fill statistics stored alongside the model
+    future_dates, future_features = feature_pipeline(metadata, history).future_features(history, horizon)
+    with stage("predict"):
+        yhat = np.asarray(model.predict(future_features), dtype=np.float64)
+    # ✅ Conformal band calibrated at training time and stored with the version
+    lower, upper = tree_intervals(yhat, metadata.get("intervals"))
+    return pd.DataFrame({"ds": future_dates, "yhat": yhat, "yhat_lower": lower, "yhat_upper": upper})
+
+
+def _write_atomic(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _prune(path):
+    # Older versions/data of the same model and series can never be looked up again
+    series = os.path.basename(path).split("__", 1)[0]
+    for stale in glob.glob(os.path.join(os.path.dirname(path), f"{glob.escape(series)}__*.parquet")):
+        if stale != path:
+            os.remove(stale)
+
+
+def precompute(name, series=None, forecast_dir=FORECAST_DIR):
+    # Called right after training: registry models are fitted on the aggregate, so only the aggregate is cached
+    series = [None] if series is None else series
+    for series_id in series:
+        check_series(name, series_id)
+    token, key = model_token(name), data_key()
+    if token is None:
+        raise FileNotFoundError(f"❌ No hay modelo entrenado para {name}")
+    # Load exactly the version named by the token, so a concurrent activation can't pair a model with another's key
+    model, metadata = load_model(name, token_version(token))
+    paths = []
+    for series_id in series:
+        path = cache_path(name, token, series_id, key, forecast_dir)
+        if not os.path.exists(path):
+            history = load_history(series_id=series_id).dropna(subset=["y"]).reset_index(drop=True)
+            _write_atomic(compute_forecast(name, history, MAX_HORIZON, model, metadata), path)
+            _prune(path)
+        paths.append(path)
+    return paths
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _read(path):
+    # Cache files are immutable (the key changes instead), so path is a complete cache key
+    return pd.read_parquet(path)
+
+
+@timed("forecast.lookup")
+def load_forecast(name, horizon=MAX_HORIZON, series_id=None, forecast_dir=FORECAST_DIR):
+    if not 1 <= horizon <= MAX_HORIZON:
+        raise ValueError(f"❌ El horizonte debe estar entre 1 y {MAX_HORIZON}")
+    check_series(name, series_id)
+    token = model_token(name)
+    if token is None:
+        raise FileNotFoundError(f"❌ No hay modelo entrenado para {name}")
+    path = cache_path(name, token, series_id, data_key(), forecast_dir)
+    if not os.path.exists(path):
+        # ✅ Miss (new version/data not precomputed yet): computed once, then every horizon is a lookup
+        path = precompute(name, [series_id], forecast_dir)[0]
+    return _read(path).iloc[:horizon]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalcula y guarda el pronóstico a 365 días (serie agregada) de cada modelo.")
+    parser.add_argument("models", nargs="*", default=list(MODELS), help=f"Modelos: {', '.join(MODELS)}")
+    args = parser.parse_args()
+
+    for name in args.models:
+        if name not in MODELS:
+            parser.error(f"modelo desconocido: {name}")
+        paths = precompute(name)
+        print(f"✅ {name}: {len(paths)} pronósticos en caché en {os.path.join(FORECAST_DIR, name)}")
@@ -2,6 +2,10 @@ import pandas as pd
 import numpy as np
 import os
 
+# Get Paths
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+EXTERNAL_PATH = os.path.join(BASE_DIR, "data", "external_factors.csv")
+
 np.random.seed(42)
 dates = pd.date_range(start="2024-01-01", periods=730, freq="D")
 
@@ -10,6 +14,7 @@ prices = np.random.uniform(18, 25, size=len(dates))
 
 df = pd.DataFrame({"ds": dates, "Temperature": temperature, "Price": prices})  # ✅ `ds` corregido
 
-df.to_csv("../data/external_factors.csv", index=False)
+os.makedirs(os.path.dirname(EXTERNAL_PATH), exist_ok=True)
+df.to_csv(EXTERNAL_PATH, index=False)
 
 print("✅ Datos de clima y precios generados correctamente.")
@@ -0,0 +1,194 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from batch_forecast import SERIES_COL, exogenous_columns, load_long_table, run_batch
+
+# Get Paths
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_DIR = os.path.join(BASE_DIR, "data", "hierarchy")
+
+# 📌 Hierarchy: a table of bottom series (series_id) with one column per attribute (sku, brand, region, ...);
+# each level groups the bottom series by some of those columns, "total" is the national level
+TOTAL = "total"
+BOTTOM = "series_id"
+METHODS = ("bottom_up", "top_down", "mint")
+
+
+class Hierarchy:
+    def __init__(self, nodes, S, bottom):
+        # Node order: aggregate levels first, bottom series last; S is the sparse (nodes × bottom) summing matrix
+        self.nodes = nodes
+        self.S = S
+        self.bottom = bottom
+
+    @property
+    def n_aggregates(self):
+        return self.S.shape[0] - self.S.shape[1]
+
+
+def _node_labels(spec, columns):
+    labels = pd.Series("", index=spec.index)
+    for i, col in enumerate(columns):
+        labels = labels + ("|" if i else "") + f"{col}=" + spec[col].astype(str)
+    return labels.to_numpy()
+
+
+def build_hierarchy(spec, levels):
+    # `levels` lists column groups, e.g. [["region"], ["brand"], ["region", "brand"]]
+    spec = spec.drop_duplicates(SERIES_COL).reset_index(drop=True)
+    bottom = spec[SERIES_COL].astype(str).to_numpy()
+    m = len(bottom)
+    columns = np.arange(m)
+
+    blocks, names, level_names = [], [], []
+    groupings = [(TOTAL, None), *((",".join(cols), cols) for cols in levels)]
+    for level, cols in groupings:
+        if cols is None:
+            codes, uniques = np.zeros(m, dtype=np.int64), np.array([TOTAL], dtype=object)
+        else:
+            codes, uniques = pd.factorize(_node_labels(spec, cols))
+        blocks.append(sparse.csr_matrix((np.ones(m), (codes, columns)), shape=(len(uniques), m)))
+        names.extend(uniques)
+        level_names.extend([level] * len(uniques))
+    blocks.append(sparse.identity(m, format="csr"))
+    names.extend(bottom)
+    level_names.extend([BOTTOM] * m)
+
+    S = sparse.vstack(blocks, format="csr")
+    nodes = pd.DataFrame({"node": names, "level": level_names})
+    return Hierarchy(nodes, S, bottom)
+
+
+def aggregate(hierarchy, df):
+    # ✅ Every node's history is S @ (bottom × date matrix): one sparse product instead of a group-by per level
+    rows = pd.Index(hierarchy.bottom).get_indexer(df[SERIES_COL].astype(str))
+    if (rows < 0).any():
+        missing = df.loc[rows < 0, SERIES_COL].unique()[:5]
+        raise ValueError(f"❌ Series sin definir en la jerarquía: {', '.join(map(str, missing))}")
+    dates, cols = np.unique(df["ds"].to_numpy(), return_inverse=True)
+    shape = (len(hierarchy.bottom), len(dates))
+
+    def node_sums(values):
+        values = np.asarray(values, dtype=np.float64)
+        observed = ~np.isnan(values)
+        totals, counts = np.zeros(shape), np.zeros(shape)
+        totals[rows[observed], cols[observed]] = values[observed]
+        counts[rows[observed], cols[observed]] = 1
+        return hierarchy.S @ totals, hierarchy.S @ counts
+
+    n_nodes = len(hierarchy.nodes)
+    table = pd.DataFrame({
+        SERIES_COL: np.repeat(hierarchy.nodes["node"].to_numpy(), len(dates)),
+        "ds": np.tile(dates, n_nodes),
+    })
+    y, counts = node_sums(df["y"])
+    table["y"] = np.where(counts > 0, y, np.nan).ravel()
+    # Exogenous drivers (temperature, price) are averaged over the children of each node
+    for col in exogenous_columns(df):
+        totals, counts = node_sums(df[col])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            table[col] = np.where(counts > 0, totals / np.maximum(counts, 1), np.nan).ravel()
+    return table
+
+
+def bottom_up(hierarchy, base):
+    return hierarchy.S @ base[hierarchy.n_aggregates:]
+
+
+def top_down(hierarchy, base, history):
+    # Average historical proportions of each bottom series in the total
+    y = history[hierarchy.n_aggregates:]
+    shares = np.nansum(y, axis=1) / max(np.nansum(y), 1e-12)
+    return hierarchy.S @ (shares[:, None] * base[0][None, :])
+
+
+def mint(hierarchy, base, weights=None):
+    # MinT with a diagonal W (default: structural scaling, i.e. number of bottom series under each node).
+    # G = (S' W⁻¹ S)⁻¹ S' W⁻¹ is applied through the Woodbury identity: only a sparse LU of the
+    # (aggregates × aggregates) system is needed, never a dense (bottom × bottom) or (nodes × nodes) matrix.
+    S, k = hierarchy.S, hierarchy.n_aggregates
+    weights = np.asarray(S.sum(axis=1)).ravel() if weights is None else np.asarray(weights, dtype=np.float64)
+    w_agg, w_bottom = weights[:k], weights[k:]
+    S_agg = S[:k]
+
+    rhs = S.T @ (base / weights[:, None])
+    x = w_bottom[:, None] * rhs
+    inner = (sparse.diags(w_agg) + S_agg @ sparse.diags(w_bottom) @ S_agg.T).tocsc()
+    correction = splu(inner).solve(np.ascontiguousarray(S_agg @ x))
+    bottom = x - w_bottom[:, None] * (S_agg.T @ correction)
+    return S @ bottom
+
+
+def reconcile(hierarchy, base, method="mint", history=None, weights=None):
+    if method == "bottom_up":
+        return bottom_up(hierarchy, base)
+    if method == "top_down":
+        if history is None:
+            raise ValueError("❌ top_down necesita el historial de los nodos")
+        return top_down(hierarchy, base, history)
+    if method == "mint":
+        return mint(hierarchy, base, weights)
+    raise ValueError(f"❌ Método de reconciliación no soportado: {method}")
+
+
+def forecast_hierarchy(df, hierarchy, model="lightgbm", horizon=90, method="mint", max_workers=None):
+    table = aggregate(hierarchy, df)
+    # ✅ Base forecasts for every node come from the batch engine (pooled tree model or Prophet per series in parallel)
+    forecast, timings = run_batch(table, models=(model,), horizon=horizon, max_workers=max_workers)
+
+    nodes = hierarchy.nodes["node"].to_numpy()
+    dates, cols = np.unique(forecast["ds"].to_numpy(), return_inverse=True)
+    rows = pd.Index(nodes).get_indexer(forecast[SERIES_COL])
+    base = np.full((len(nodes), len(dates)), np.nan)
+    base[rows, cols] = forecast["yhat"].to_numpy()
+
+    history = table["y"].to_numpy().reshape(len(nodes), -1)
+    reconciled = reconcile(hierarchy, np.nan_to_num(base), method, history)
+    result = pd.DataFrame({
+        "node": np.repeat(nodes, len(dates)),
+        "level": np.repeat(hierarchy.nodes["level"].to_numpy(), len(dates)),
+        "ds": np.tile(dates, len(nodes)),
+        "yhat_base": base.ravel(),
+        "yhat": np.asarray(reconciled).ravel(),
+    })
+    return result, timings
+
+
+def coherence_error(hierarchy, values):
+    # Largest gap between each node and the sum of its bottom series
+    values = np.nan_to_num(np.asarray(values))
+    return float(np.abs(values - hierarchy.S @ values[hierarchy.n_aggregates:]).max())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pronóstico jerárquico (SKU, marca, región, nacional) con reconciliación.")
+    parser.add_argument("input", help="CSV en formato largo: series_id, ds, y y columnas exógenas")
+    parser.add_argument("hierarchy", help="CSV con series_id y una columna por atributo (p. ej. sku, marca, region)")
+    parser.add_argument("--levels", nargs="+", required=True, help="Niveles como columnas separadas por coma, p. ej. region marca region,marca")
+    parser.add_argument("--model", default="lightgbm", choices=["prophet", "lightgbm", "xgboost"])
+    parser.add_argument("--method", default="mint", choices=METHODS)
+    parser.add_argument("--horizon", type=int, default=90)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    df = load_long_table(args.input)
+    spec = pd.read_csv(args.hierarchy, dtype=str)
+    hierarchy = build_hierarchy(spec, [level.split(",") for level in args.levels])
+    print(f"🔄 {len(hierarchy.nodes)} nodos ({len(hierarchy.bottom)} series base), modelo {args.model}, reconciliación {args.method}...")
+
+    started = time.perf_counter()
+    result, timings = forecast_hierarchy(df, hierarchy, args.model, args.horizon, args.method, args.workers)
+    base = result["yhat_base"].to_numpy().reshape(len(hierarchy.nodes), -1)
+    reconciled = result["yhat"].to_numpy().reshape(len(hierarchy.nodes), -1)
+    print(f"📏 Incoherencia máxima: base {coherence_error(hierarchy, base):.3f} → reconciliado {coherence_error(hierarchy, reconciled):.3f}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    result.to_csv(os.path.join(args.output_dir, "hierarchy_forecast.csv"), index=False)
+    print(f"✅ Pronóstico jerárquico guardado en: {args.output_dir} ({time.perf_counter() - started:.1f}s)")
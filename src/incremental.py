@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import logging
+import runpy
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataset_store import load_history, load_sales
+from forecast_cache import precompute
+from model_registry import MODELS, data_hash, feature_pipeline, load_model, register
+
+# 📌 Full-Refit Policy: incremental updates drift from a fresh fit, so refit when any limit is hit
+MAX_UPDATES_SINCE_FULL = 28      # nightly updates before a scheduled full refit
+MAX_DAYS_SINCE_FULL = 35         # age of the last full refit
+MAX_NEW_FRACTION = 0.25          # new rows relative to rows already trained on
+MAX_TREES = 1000                 # bound on booster growth from continued boosting
+UPDATE_ROUNDS = 10               # boosting rounds added per incremental update
+UPDATE_WINDOW_DAYS = 90          # recent history boosted on together with the new days
+UPDATE_MIN_LEAF = 5              # a few new days are fewer rows than LightGBM's default min_data_in_leaf (20)
+TREE_PARAMS = {"learning_rate": 0.1, "max_depth": 5}
+
+
+def full_refit_reason(metadata, new_rows, tree_count=None):
+    if metadata.get("version") == "legacy" or not metadata.get("last_ds"):
+        return "modelo sin historial de entrenamiento registrado"
+    if metadata.get("updates_since_full", 0) >= MAX_UPDATES_SINCE_FULL:
+        return f"{MAX_UPDATES_SINCE_FULL} actualizaciones desde el último reentrenamiento completo"
+    full_refit_at = pd.Timestamp(metadata["full_refit_at"])
+    if pd.Timestamp.now(tz="UTC") - full_refit_at > pd.Timedelta(days=MAX_DAYS_SINCE_FULL):
+        return f"último reentrenamiento completo hace más de {MAX_DAYS_SINCE_FULL} días"
+    if new_rows > MAX_NEW_FRACTION * max(metadata.get("trained_rows", 0), 1):
+        return f"más de {MAX_NEW_FRACTION:.0%} de filas nuevas"
+    if tree_count is not None and tree_count + UPDATE_ROUNDS > MAX_TREES:
+        return f"el modelo alcanzó {MAX_TREES} árboles"
+    return None
+
+
+def _tree_count(model, kind):
+    if kind == "lightgbm":
+        return model.num_trees()
+    return model.get_booster().num_boosted_rounds()
+
+
+def _new_tail(metadata, pipeline):
+    # ✅ Only the appended days, the recent window and the lag/rolling context are loaded, merged and featurized
+    last_ds = pd.Timestamp(metadata["last_ds"])
+    window_start = last_ds - pd.Timedelta(days=UPDATE_WINDOW_DAYS)
+    start = window_start - pd.Timedelta(days=pipeline.context_length)
+    frame = load_history(start=start).dropna(subset=["y"]).reset_index(drop=True)
+    is_new = (frame["ds"] > last_ds).to_numpy()
+    # The update rounds fit the new days together with the recent window, so there are enough rows to split on
+    in_window = (frame["ds"] > window_start).to_numpy()
+    return frame, is_new, in_window
+
+
+def _update_params(metadata):
+    # The parent version's hyperparameters (tuned or default), with a leaf size small enough for the update window
+    params = {key: value for key, value in (metadata.get("hyperparameters") or TREE_PARAMS).items() if key != "n_estimators"}
+    params["min_child_samples"] = min(params.get("min_child_samples", UPDATE_MIN_LEAF), UPDATE_MIN_LEAF)
+    return params
+
+
+def _continue_boosting(model, kind, X, y, params):
+    if kind == "lightgbm":
+        import lightgbm as lgb
+        params = {"objective": "regression", "verbose": -1, **params}
+        return lgb.train(params, lgb.Dataset(X, y, params={"feature_pre_filter": False}), num_boost_round=UPDATE_ROUNDS, init_model=model)
+    import xgboost as xgb
+    params = {key: value for key, value in params.items() if key not in ("min_child_samples", "subsample_freq")}
+    updated = xgb.XGBRegressor(**{**params, "n_estimators": UPDATE_ROUNDS, "min_child_weight": min(params.get("min_child_weight", 1), 1)})
+    updated.fit(X, y, xgb_model=model.get_booster())
+    return updated
+
+
+def _prophet_warm_start(model):
+    # Previous optimum as Stan's starting point; Prophet still sees the whole series but converges in few iterations
+    return {
+        "k": float(model.params["k"][0][0]),
+        "m": float(model.params["m"][0][0]),
+        "sigma_obs": float(model.params["sigma_obs"][0][0]),
+        "delta": model.params["delta"][0],
+        "beta": model.params["beta"][0],
+    }
+
+
+def _lineage(metadata, new_rows):
+    return {
+        "refit": "incremental",
+        "parent_version": metadata["version"],
+        "trained_rows": metadata["trained_rows"] + new_rows,
+        "updates_since_full": metadata.get("updates_since_full", 0) + 1,
+        "full_refit_at": metadata["full_refit_at"],
+        # Interval calibration, hyperparameters and holdout metrics are refreshed on the next full refit
+        "intervals": metadata.get("intervals"),
+        "hyperparameters": metadata.get("hyperparameters"),
+    }
+
+
+def update_tree_model(name, force_full=False):
+    model, metadata = load_model(name)
+    kind = MODELS[name]["kind"]
+    if force_full or metadata.get("version") == "legacy" or not metadata.get("features"):
+        return full_refit(name, "reentrenamiento completo solicitado" if force_full else "modelo sin historial de entrenamiento registrado")
+
+    pipeline = feature_pipeline(metadata, None)
+    frame, is_new, in_window = _new_tail(metadata, pipeline)
+    if not is_new.any():
+        print(f"✅ {name}: sin datos nuevos desde {metadata['last_ds']}.")
+        return metadata["version"]
+
+    reason = full_refit_reason(metadata, int(is_new.sum()), _tree_count(model, kind))
+    if reason:
+        return full_refit(name, reason)
+
+    started_at = time.perf_counter()
+    # Fill statistics stay the ones stored with the model, so old and new rows share one feature definition
+    X = pipeline.transform(frame)[in_window]
+    y = frame.loc[in_window, "y"].to_numpy(dtype=np.float64)
+    trees = _tree_count(model, kind)
+    updated = _continue_boosting(model, kind, X, y, _update_params(metadata))
+    if _tree_count(updated, kind) == trees:
+        # No split met the leaf requirements: the model is unchanged, so no new version is registered
+        print(f"⚠ {name}: la actualización no agregó árboles; se conserva {metadata['version']}.")
+        return metadata["version"]
+    tail = frame[is_new]
+    return register(
+        name, updated, tail, features=pipeline.to_dict(), metrics=metadata.get("metrics"), started_at=started_at,
+        # Chained hash: identifies parent data + appended tail without re-reading the full history
+        training_data_hash=hashlib.sha256(f"{metadata.get('training_data_hash')}:{data_hash(tail)}".encode()).hexdigest()[:16],
+        **_lineage(metadata, len(tail)),
+    )
+
+
+def update_prophet(force_full=False):
+    from prophet import Prophet
+
+    model, metadata = load_model("prophet")
+    if force_full:
+        return full_refit("prophet", "reentrenamiento completo solicitado")
+    df = load_sales(columns=["ds", "y"]).dropna()
+    new_rows = int((df["ds"] > pd.Timestamp(metadata["last_ds"])).sum()) if metadata.get("last_ds") else len(df)
+    if metadata.get("last_ds") and new_rows == 0:
+        print(f"✅ prophet: sin datos nuevos desde {metadata['last_ds']}.")
+        return metadata["version"]
+    reason = full_refit_reason(metadata, new_rows)
+    if reason:
+        return full_refit("prophet", reason)
+
+    started_at = time.perf_counter()
+    updated = Prophet(yearly_seasonality=True, weekly_seasonality=False, changepoint_prior_scale=0.05)
+    updated.fit(df, init=_prophet_warm_start(model))
+    return register("prophet", updated, df, metrics=metadata.get("metrics"), started_at=started_at, **_lineage(metadata, new_rows))
+
+
+def full_refit(name, reason):
+    print(f"🔄 {name}: reentrenamiento completo ({reason})...")
+    runpy.run_path(MODELS[name]["script"], run_name="__main__")
+    return load_model(name)[1]["version"]
+
+
+def update(name, force_full=False):
+    if MODELS[name]["kind"] == "prophet":
+        version = update_prophet(force_full)
+    else:
+        version = update_tree_model(name, force_full)
+    # Full refits precompute in the training script; this covers incremental versions and new data
+    precompute(name)
+    return version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actualización incremental (nocturna) de los modelos con los días nuevos de ventas.")
+    parser.add_argument("models", nargs="*", default=list(MODELS), help=f"Modelos a actualizar: {', '.join(MODELS)}")
+    parser.add_argument("--full", action="store_true", help="Forzar reentrenamiento completo")
+    args = parser.parse_args()
+
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    for name in args.models:
+        if name not in MODELS:
+            parser.error(f"modelo desconocido: {name}")
+        started = time.perf_counter()
+        version = update(name, args.full)
+        print(f"✅ {name}: versión activa {version} ({time.perf_counter() - started:.2f}s)")
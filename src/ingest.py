@@ -0,0 +1,146 @@
+import argparse
+import glob
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Get Paths
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SALES_CSV_PATH = os.path.join(BASE_DIR, "data", "dairy_forecast_data.csv")
+EXTERNAL_CSV_PATH = os.path.join(BASE_DIR, "data", "external_factors.csv")
+STORE_DIR = os.path.join(BASE_DIR, "data", "store")
+
+SERIES_COL = "series_id"
+DEFAULT_SERIES = "total"
+EXOGENOUS_COLUMNS = ["Temperature", "Price"]
+CHUNKSIZE = 1_000_000
+
+
+def table_dir(name, store_dir=STORE_DIR):
+    return os.path.join(store_dir, name)
+
+
+def _spill(aggregated, staging_dir, part):
+    # One small Parquet file per (chunk, year); partial sums are combined when the partition is compacted
+    years = aggregated["ds"].dt.year.to_numpy()
+    for year in np.unique(years):
+        year_dir = os.path.join(staging_dir, f"year={year}")
+        os.makedirs(year_dir, exist_ok=True)
+        aggregated[years == year].to_parquet(os.path.join(year_dir, f"part-{part:05d}.parquet"), index=False)
+
+
+def _compact(staging_dir, output_dir, keys, finalize):
+    # ✅ Partitions are compacted one year at a time, so memory is bounded by the largest year
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    for year_dir in sorted(glob.glob(os.path.join(staging_dir, "year=*"))):
+        partition = pd.read_parquet(year_dir)
+        partition = finalize(partition.groupby(keys, observed=True, sort=True).sum().reset_index())
+        target = os.path.join(output_dir, os.path.basename(year_dir))
+        os.makedirs(target, exist_ok=True)
+        partition.to_parquet(os.path.join(target, "part-0.parquet"), index=False)
+    shutil.rmtree(staging_dir)
+
+
+def ingest_sales(path, store_dir=STORE_DIR, date_col="Date", value_col="Sales_Volume", series_cols=None, chunksize=CHUNKSIZE):
+    series_cols = list(series_cols or [])
+    staging_dir = table_dir("_staging_sales", store_dir)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    reader = pd.read_csv(
+        path,
+        usecols=[date_col, value_col, *series_cols],
+        dtype={value_col: "float64", **{col: "string" for col in series_cols}},
+        chunksize=chunksize,
+    )
+    rows = 0
+    for part, chunk in enumerate(reader):
+        rows += len(chunk)
+        series = chunk[series_cols[0]].str.cat(chunk[series_cols[1:]], sep="|") if series_cols else DEFAULT_SERIES
+        daily = pd.DataFrame({
+            SERIES_COL: series,
+            "ds": pd.to_datetime(chunk[date_col], cache=True).dt.normalize(),
+            "y": chunk[value_col],
+        })
+        _spill(daily.groupby([SERIES_COL, "ds"], sort=False).sum().reset_index(), staging_dir, part)
+
+    def finalize(partition):
+        partition[SERIES_COL] = partition[SERIES_COL].astype("category")
+        partition["y"] = partition["y"].round().astype(np.int32)
+        return partition
+
+    _compact(staging_dir, table_dir("sales", store_dir), [SERIES_COL, "ds"], finalize)
+    return rows
+
+
+def ingest_external(path, store_dir=STORE_DIR, date_col="Date", columns=EXOGENOUS_COLUMNS, chunksize=CHUNKSIZE):
+    staging_dir = table_dir("_staging_external", store_dir)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    # external_factors.csv has been written with both `Date` and `ds` headers
+    header = pd.read_csv(path, nrows=0).columns
+    date_col = date_col if date_col in header else "ds"
+    reader = pd.read_csv(path, usecols=[date_col, *columns], dtype={col: "float64" for col in columns}, chunksize=chunksize)
+    rows = 0
+    for part, chunk in enumerate(reader):
+        rows += len(chunk)
+        # Sums and counts (not means) so readings of one day split across chunks combine exactly
+        daily = chunk[columns].copy()
+        daily["ds"] = pd.to_datetime(chunk[date_col], cache=True).dt.normalize()
+        for col in columns:
+            daily[f"{col}_count"] = daily[col].notna().astype(np.int64)
+        _spill(daily.groupby("ds", sort=False).sum(min_count=0).reset_index(), staging_dir, part)
+
+    def finalize(partition):
+        for col in columns:
+            counts = partition.pop(f"{col}_count").to_numpy()
+            with np.errstate(invalid="ignore", divide="ignore"):
+                partition[col] = np.where(counts > 0, partition[col].to_numpy() / counts, np.nan).astype(np.float32)
+        return partition
+
+    _compact(staging_dir, table_dir("external", store_dir), ["ds"], finalize)
+    return rows
+
+
+def store_exists(name, store_dir=STORE_DIR):
+    return bool(glob.glob(os.path.join(table_dir(name, store_dir), "year=*", "*.parquet")))
+
+
+def read_store(name, columns=None, start=None, end=None, store_dir=STORE_DIR):
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(table_dir(name, store_dir), format="parquet", partitioning="hive")
+    # ✅ Date bounds prune whole year partitions before any row group is read
+    predicate = None
+    if start is not None:
+        start = pd.Timestamp(start)
+        predicate = (ds.field("year") >= start.year) & (ds.field("ds") >= start)
+    if end is not None:
+        end = pd.Timestamp(end)
+        bound = (ds.field("year") <= end.year) & (ds.field("ds") <= end)
+        predicate = bound if predicate is None else predicate & bound
+    columns = [c for c in columns if c != "year"] if columns else [c for c in dataset.schema.names if c != "year"]
+    df = dataset.to_table(columns=columns, filter=predicate).to_pandas()
+    if SERIES_COL in df.columns:
+        df[SERIES_COL] = df[SERIES_COL].astype("category")
+    return df.sort_values([c for c in (SERIES_COL, "ds") if c in df.columns], ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingesta por bloques de ventas y factores externos a un almacén Parquet particionado.")
+    parser.add_argument("table", choices=["sales", "external"])
+    parser.add_argument("path", nargs="?", help="CSV de origen (por defecto el dataset del proyecto)")
+    parser.add_argument("--date-col", default="Date")
+    parser.add_argument("--value-col", default="Sales_Volume")
+    parser.add_argument("--series-cols", nargs="*", default=None, help="Columnas que identifican la serie (p. ej. sku centro)")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    args = parser.parse_args()
+
+    if args.table == "sales":
+        rows = ingest_sales(args.path or SALES_CSV_PATH, args.store_dir, args.date_col, args.value_col, args.series_cols, args.chunksize)
+    else:
+        rows = ingest_external(args.path or EXTERNAL_CSV_PATH, args.store_dir, args.date_col, chunksize=args.chunksize)
+    print(f"✅ {rows} filas ingeridas en: {table_dir(args.table, args.store_dir)}")
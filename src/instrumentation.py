@@ -0,0 +1,190 @@
+import argparse
+import contextlib
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 📌 Stage Timers: off unless DAIRY_INSTRUMENT is set ("1" = timers, "log" = timers + one JSON log line per stage)
+ENV_FLAG = "DAIRY_INSTRUMENT"
+METRIC_PREFIX = "dairy_stage"
+
+logger = logging.getLogger("dairy.instrumentation")
+_mode = os.environ.get(ENV_FLAG, "").lower()
+_enabled = _mode not in ("", "0", "false")
+_log = _mode == "log"
+_lock = threading.Lock()
+_stats = {}
+_local = threading.local()
+_NULL = contextlib.nullcontext()
+
+
+def _max_rss():
+    # Process high-water mark in bytes (ru_maxrss is KiB on Linux, bytes on macOS)
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class _Stage:
+    __slots__ = ("name", "started", "rss")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.rss = _max_rss()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        rss = _max_rss()
+        growth = rss - self.rss if rss is not None else None
+        if _enabled:
+            with _lock:
+                stats = _stats.setdefault(self.name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0, "rss_growth_bytes": 0})
+                stats["calls"] += 1
+                stats["seconds"] += seconds
+                stats["max_seconds"] = max(stats["max_seconds"], seconds)
+                stats["errors"] += exc_type is not None
+                stats["rss_growth_bytes"] += growth or 0
+        events = getattr(_local, "events", None)
+        if events is not None:
+            events.append({"stage": self.name, "seconds": seconds, "rss_growth_bytes": growth})
+        if _log:
+            logger.info(json.dumps({"stage": self.name, "seconds": round(seconds, 6), "rss_growth_bytes": growth, "error": exc_type is not None}))
+        return False
+
+
+def _recording():
+    # Process-wide switch (CLI runs, DAIRY_INSTRUMENT) or a thread collecting its own stages (one app session)
+    return _enabled or getattr(_local, "events", None) is not None
+
+
+def stage(name):
+    # ✅ Disabled: a shared no-op context manager, so the hot path pays one flag check
+    return _Stage(name) if _recording() else _NULL
+
+
+def timed(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _recording():
+                return fn(*args, **kwargs)
+            with _Stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable(log=False):
+    global _enabled, _log
+    _enabled, _log = True, log
+
+
+def disable():
+    global _enabled, _log
+    _enabled, _log = False, False
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def snapshot():
+    with _lock:
+        return {name: dict(stats) for name, stats in sorted(_stats.items())}
+
+
+def track(active=True):
+    # Start recording the current thread's stages (top of a Streamlit rerun) and return the live list; with
+    # active=False stop and return None. Only this thread records, so one session's choice never affects another's,
+    # and the process-wide statistics are left to enable()/DAIRY_INSTRUMENT.
+    _local.events = [] if active else None
+    return _local.events
+
+
+@contextlib.contextmanager
+def collect():
+    # Stages run by the current thread inside the block (one Streamlit rerun, one request, one script)
+    previous = getattr(_local, "events", None)
+    _local.events = events = []
+    try:
+        yield events
+    finally:
+        _local.events = previous
+
+
+def to_prometheus():
+    stats = snapshot()
+    metrics = [
+        ("calls_total", "calls", "counter", "Stage executions."),
+        ("seconds_total", "seconds", "counter", "Wall-clock seconds spent in the stage."),
+        ("seconds_max", "max_seconds", "gauge", "Slowest single execution."),
+        ("errors_total", "errors", "counter", "Executions that raised."),
+        ("rss_growth_bytes_total", "rss_growth_bytes", "counter", "Process peak RSS growth while inside the stage."),
+    ]
+    lines = []
+    for metric, key, kind, help_text in metrics:
+        lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{metric} {kind}")
+        lines.extend(f'{METRIC_PREFIX}_{metric}{{stage="{name}"}} {values[key]}' for name, values in stats.items())
+    rss = _max_rss()
+    if rss is not None:
+        lines += ["# HELP process_max_rss_bytes Process peak resident memory.", "# TYPE process_max_rss_bytes gauge", f"process_max_rss_bytes {rss}"]
+    return "\n".join(lines) + "\n"
+
+
+@contextlib.contextmanager
+def profile(path):
+    # Opt-in deterministic profile of a block, written as a .prof file (snakeviz / pstats); stages are
+    # plain function calls, so py-spy (`py-spy record -- python src/...`) shows them without this
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ejecuta un script con los temporizadores de etapas (y cProfile opcional).")
+    parser.add_argument("script", help="Script de src/ a ejecutar, p. ej. src/sap_ibp_forecast.py")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    parser.add_argument("--profile", help="Guardar un perfil cProfile en esta ruta (.prof)")
+    parser.add_argument("--format", choices=["prometheus", "json"], default="prometheus")
+    args = parser.parse_args()
+
+    import pstats
+    import runpy
+
+    # The script's modules import `instrumentation`, not this `__main__` copy, so use that module's registry
+    import instrumentation
+
+    instrumentation.enable()
+    sys.argv = [args.script, *args.args]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    with profile(args.profile) if args.profile else contextlib.nullcontext():
+        runpy.run_path(args.script, run_name="__main__")
+    print(instrumentation.to_prometheus() if args.format == "prometheus" else json.dumps(instrumentation.snapshot(), indent=2))
+    if args.profile:
+        pstats.Stats(args.profile).sort_stats("cumulative").print_stats(25)
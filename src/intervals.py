@@ -0,0 +1,88 @@
+import copy
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+# 📌 Prediction Intervals: whole horizons at once as NumPy arrays, no per-row sampling
+INTERVAL_WIDTH = 0.8             # same coverage as Prophet's default interval_width
+CALIBRATION_FOLDS = 5
+CALIBRATION_HORIZON = 28
+LEGACY_HALF_WIDTH = 10           # fixed band kept only for models trained before calibration existed
+
+# 📌 Prophet: "analytic" = observation noise (sigma_obs) as a normal band, no sampling;
+# "sampling" = Prophet's own simulation with PROPHET_SAMPLES draws instead of the default 1000
+PROPHET_INTERVALS = "analytic"
+PROPHET_SAMPLES = 100
+
+
+def _conformal_quantile(scores, level):
+    # Split-conformal finite-sample correction: the ceil((n + 1) * level)-th smallest score
+    n = len(scores)
+    rank = min(math.ceil((n + 1) * level), n)
+    return float(np.partition(scores, rank - 1)[rank - 1])
+
+
+def conformal_calibration(residuals, width=INTERVAL_WIDTH):
+    # Residuals are y - yhat on held-out rows; lower/upper are offsets added to yhat
+    residuals = np.asarray(residuals, dtype=np.float64)
+    residuals = residuals[~np.isnan(residuals)]
+    if not len(residuals):
+        return None
+    alpha = (1 - width) / 2
+    return {
+        "method": "conformal",
+        "width": width,
+        "lower": -_conformal_quantile(-residuals, 1 - alpha),
+        "upper": _conformal_quantile(residuals, 1 - alpha),
+        "residuals": int(len(residuals)),
+    }
+
+
+def tree_backtest(kind, df, n_folds=CALIBRATION_FOLDS, horizon=CALIBRATION_HORIZON, params=None):
+    # Out-of-sample predictions from a rolling-origin backtest (src/backtest.py): every fold trains on the past only,
+    # with `params` (tuned hyperparameters) so the folds match the model being registered
+    from backtest import SERIES_COL, backtest_tree, make_cutoffs
+
+    frame = df.assign(**{SERIES_COL: "total"}) if SERIES_COL not in df.columns else df
+    frame = frame.sort_values([SERIES_COL, "ds"], ignore_index=True)
+    predictions, _ = backtest_tree(frame, kind, make_cutoffs(frame, n_folds, horizon), horizon, params=params)
+    return predictions
+
+
+def calibrate_tree(kind, df, width=INTERVAL_WIDTH, n_folds=CALIBRATION_FOLDS, horizon=CALIBRATION_HORIZON, predictions=None, params=None):
+    # ✅ Residuals come from a rolling-origin backtest, not from rows the model was fitted on; pass `predictions`
+    # to reuse a backtest already run. Features only use lags >= 365 days, so errors don't grow with the horizon
+    # and one pooled band fits all of it.
+    if predictions is None:
+        predictions = tree_backtest(kind, df, n_folds, horizon, params)
+    return conformal_calibration(predictions["y"].to_numpy() - predictions["yhat"].to_numpy(), width)
+
+
+def holdout_metrics(predictions):
+    # MAE / MAPE over backtest predictions (days with zero sales are left out of MAPE)
+    y = predictions["y"].to_numpy(dtype=np.float64)
+    error = np.abs(y - predictions["yhat"].to_numpy(dtype=np.float64))
+    return {"mae": float(np.mean(error)), "mape": float(np.mean(error[y != 0] / np.abs(y[y != 0])))}
+
+
+def tree_intervals(yhat, calibration):
+    yhat = np.asarray(yhat, dtype=np.float64)
+    if not calibration:
+        return yhat - LEGACY_HALF_WIDTH, yhat + LEGACY_HALF_WIDTH
+    return yhat + calibration["lower"], yhat + calibration["upper"]
+
+
+def prophet_forecast(model, future, mode=PROPHET_INTERVALS, samples=PROPHET_SAMPLES):
+    # Shallow copy: the loaded model is shared through the registry LRU, so its settings are never mutated
+    model = copy.copy(model)
+    model.uncertainty_samples = samples if mode == "sampling" else 0
+    forecast = model.predict(future)
+    if mode == "sampling":
+        return forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]]
+
+    # Observation noise only (trend-change uncertainty is ignored), on the original scale of y
+    z = NormalDist().inv_cdf((1 + model.interval_width) / 2)
+    half_width = z * float(np.ravel(model.params["sigma_obs"])[0]) * model.y_scale
+    yhat = forecast["yhat"].to_numpy()
+    return forecast[["ds", "yhat"]].assign(yhat_lower=yhat - half_width, yhat_upper=yhat + half_width)
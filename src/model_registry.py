@@ -0,0 +1,239 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+
+from instrumentation import timed
+
+# Get Paths
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+REGISTRY_DIR = os.path.join(BASE_DIR, "models", "registry")
+
+# ✅ Lightweight at import (no pandas, no model libraries): model_token/active_version are plain file reads, and
+# loading a version imports only that version's backend (Prophet, LightGBM or XGBoost) on first use
+# 📌 Registered models: backend, training script and the pickle they were saved to before the registry existed
+MODELS = {
+    "prophet": {
+        "kind": "prophet",
+        "script": os.path.join(BASE_DIR, "src", "train_model.py"),
+        "legacy_path": os.path.join(BASE_DIR, "models", "trained_model.pkl"),
+    },
+    "sap_ibp": {
+        "kind": "lightgbm",
+        "script": os.path.join(BASE_DIR, "src", "sap_ibp_forecast.py"),
+        "legacy_path": os.path.join(BASE_DIR, "models", "sap_ibp_model.pkl"),
+    },
+    "oracle_scm": {
+        "kind": "xgboost",
+        "script": os.path.join(BASE_DIR, "src", "oracle_scm_forecast.py"),
+        "legacy_path": os.path.join(BASE_DIR, "models", "oracle_scm_model.pkl"),
+    },
+}
+ARTIFACT_FILES = {"prophet": "model.json", "lightgbm": "model.txt", "xgboost": "model.json"}
+ACTIVE_FILE = "ACTIVE"
+CACHE_SIZE = 8
+
+
+def check_series(name, series_id):
+    # ✅ Registry models are trained on the aggregate of every series, so they only forecast the aggregate;
+    # per-series forecasts come from the pooled global model of src/batch_forecast.py (series id as a feature)
+    if series_id is not None:
+        raise ValueError(f"❌ {name} se entrena con el agregado de todas las series; para pronósticos por serie usa src/batch_forecast.py")
+
+
+def data_hash(df):
+    # Content hash of the training frame, stored with every version
+    import pandas as pd
+
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()[:16]
+
+
+def model_dir(name, registry_dir=REGISTRY_DIR):
+    return os.path.join(registry_dir, name)
+
+
+def list_versions(name, registry_dir=REGISTRY_DIR):
+    directory = model_dir(name, registry_dir)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(entry for entry in os.listdir(directory) if entry.startswith("v") and entry[1:].isdigit())
+
+
+def active_version(name, registry_dir=REGISTRY_DIR):
+    try:
+        with open(os.path.join(model_dir(name, registry_dir), ACTIVE_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _save_native(model, kind, path):
+    if kind == "lightgbm":
+        booster = getattr(model, "booster_", model)
+        booster.save_model(path)
+    elif kind == "xgboost":
+        model.save_model(path)
+    elif kind == "prophet":
+        from prophet.serialize import model_to_json
+        with open(path, "w") as f:
+            f.write(model_to_json(model))
+    else:
+        raise ValueError(f"❌ Tipo de modelo no soportado: {kind}")
+
+
+def _load_native(kind, path):
+    if kind == "lightgbm":
+        import lightgbm as lgb
+        return lgb.Booster(model_file=path)
+    if kind == "xgboost":
+        import xgboost as xgb
+        model = xgb.XGBRegressor()
+        model.load_model(path)
+        return model
+    if kind == "prophet":
+        from prophet.serialize import model_from_json
+        with open(path) as f:
+            return model_from_json(f.read())
+    raise ValueError(f"❌ Tipo de modelo no soportado: {kind}")
+
+
+def save_model(name, model, features=None, metrics=None, training_data_hash=None, train_seconds=None, extra=None,
+               activate=True, registry_dir=REGISTRY_DIR):
+    kind = MODELS[name]["kind"]
+    directory = model_dir(name, registry_dir)
+    os.makedirs(directory, exist_ok=True)
+
+    # ✅ Build the version in a private temp dir; readers only ever see complete versions
+    tmp_dir = os.path.join(directory, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    try:
+        _save_native(model, kind, os.path.join(tmp_dir, ARTIFACT_FILES[kind]))
+        metadata = {
+            "name": name,
+            "kind": kind,
+            "artifact": ARTIFACT_FILES[kind],
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "training_data_hash": training_data_hash,
+            "train_seconds": train_seconds,
+            "features": features,
+            "metrics": metrics or {},
+            **(extra or {}),
+        }
+        while True:
+            versions = list_versions(name, registry_dir)
+            version = f"v{int(versions[-1][1:]) + 1 if versions else 1:04d}"
+            metadata["version"] = version
+            with open(os.path.join(tmp_dir, "metadata.json"), "w") as f:
+                json.dump(metadata, f, indent=2)
+            try:
+                os.rename(tmp_dir, os.path.join(directory, version))
+                break
+            except OSError:
+                # Another trainer claimed this version number first; take the next one
+                continue
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if activate:
+        activate_version(name, version, registry_dir)
+    return version
+
+
+def activate_version(name, version, registry_dir=REGISTRY_DIR):
+    if not os.path.isdir(os.path.join(model_dir(name, registry_dir), version)):
+        raise FileNotFoundError(f"❌ No existe la versión {version} de {name}")
+    # ✅ Atomic pointer swap: readers see either the old or the new version, never a partial write
+    _write_atomic(os.path.join(model_dir(name, registry_dir), ACTIVE_FILE), version)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _load_version(name, version, registry_dir):
+    # Versions are immutable once renamed into place, so caching by (name, version) is always safe
+    directory = os.path.join(model_dir(name, registry_dir), version)
+    with open(os.path.join(directory, "metadata.json")) as f:
+        metadata = json.load(f)
+    return _load_native(metadata["kind"], os.path.join(directory, metadata["artifact"])), metadata
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _load_legacy(path, mtime_ns):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def model_token(name, registry_dir=REGISTRY_DIR):
+    # Identifies exactly what load_model would return; used as a cache key by callers
+    version = active_version(name, registry_dir)
+    if version:
+        return f"{name}:{version}"
+    path = MODELS[name]["legacy_path"]
+    return f"{name}:legacy:{os.stat(path).st_mtime_ns}" if os.path.exists(path) else None
+
+
+def token_version(token):
+    # Version named by a model_token, or None for the legacy pickle (which load_model falls back to)
+    version = token.split(":")[1]
+    return None if version == "legacy" else version
+
+
+@timed("load.model")
+def load_model(name, version=None, registry_dir=REGISTRY_DIR):
+    version = version or active_version(name, registry_dir)
+    if version:
+        return _load_version(name, version, registry_dir)
+
+    # ✅ Nothing registered yet: fall back to the pickle written by the pre-registry scripts
+    path = MODELS[name]["legacy_path"]
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"❌ No hay versiones registradas de {name} ni modelo en {path}")
+    metadata = {"name": name, "kind": MODELS[name]["kind"], "version": "legacy", "features": None}
+    return _load_legacy(path, os.stat(path).st_mtime_ns), metadata
+
+
+def feature_pipeline(metadata, history):
+    # Fitted feature pipeline stored with the version, or the legacy sidecar/defaults for old pickles
+    from features import FeaturePipeline, load_model_features
+
+    if metadata.get("features"):
+        return FeaturePipeline.from_dict(metadata["features"])
+    return load_model_features(MODELS[metadata["name"]]["legacy_path"], history)
+
+
+def register(name, model, df, features=None, metrics=None, started_at=None, training_data_hash=None, **extra):
+    # Convenience for the training scripts: hashes the data, times the fit from `started_at` and records
+    # the training window that incremental updates continue from (a plain call is a full refit)
+    import pandas as pd
+
+    train_seconds = time.perf_counter() - started_at if started_at is not None else None
+    window = {
+        "last_ds": str(pd.Timestamp(df["ds"].max()).date()),
+        "trained_rows": len(df),
+        "refit": "full",
+        "updates_since_full": 0,
+        "full_refit_at": datetime.now(timezone.utc).isoformat(),
+    }
+    training_data_hash = training_data_hash or data_hash(df)
+    version = save_model(name, model, features, metrics, training_data_hash, train_seconds, {**window, **extra})
+    print(f"✅ {name} registrado como {version} en: {model_dir(name)}")
+    return version
+
+
+if __name__ == "__main__":
+    for name in MODELS:
+        versions = list_versions(name)
+        print(f"📦 {name}: activo={active_version(name) or 'legacy'} versiones={', '.join(versions) or '-'}")
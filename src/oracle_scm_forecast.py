@@ -1,43 +1,44 @@
-import pandas as pd
-import os
-import pickle
+import time
 import xgboost as xgb
-from sklearn.model_selection import train_test_split
-
-# ✅ Load Data
-DATA_PATH = "data/dairy_forecast_data.csv"
-EXTERNAL_DATA_PATH = "data/external_factors.csv"
-MODEL_PATH = "models/oracle_scm_model.pkl"
-
-df = pd.read_csv(DATA_PATH, parse_dates=["Date"]).rename(columns={"Sales_Volume": "y", "Date": "ds"})
+from features import FeaturePipeline
+from dataset_store import load_history
+from model_registry import register
+from instrumentation import stage
+from intervals import calibrate_tree, holdout_metrics, tree_backtest
+from forecast_cache import precompute
+from tuning import tuned_params
+
+# ✅ Load Data (Arrow/Parquet store if present, otherwise the CSVs, with external factors merged)
+df = load_history()
+
+# ✅ Build Features (shared pipeline; its fill statistics are stored with the model version)
+pipeline = FeaturePipeline()
+X = pipeline.fit_transform(df)
+y = df["y"]
 
-# ✅ Merge External Data
-if os.path.exists(EXTERNAL_DATA_PATH):
-    external_df = pd.read_csv(EXTERNAL_DATA_PATH, parse_dates=["Date"]).rename(columns={"Date": "ds"})
-    df = df.merge(external_df, on="ds", how="left")
+# ✅ Hyperparameters found by src/tuning.py (early-stopped tree count included), or the defaults if never tuned
+params = tuned_params("xgboost") or {"n_estimators": 100, "learning_rate": 0.1, "max_depth": 5}
 
-# ✅ Ensure No Missing Columns
-df["Temperature"].fillna(df["Temperature"].mean(), inplace=True)
-df["Price"].fillna(df["Price"].mean(), inplace=True)
+# ✅ Evaluate Out of Sample (rolling-origin backtest: each fold trains on earlier days and predicts the next ones)
+backtest_started = time.perf_counter()
+with stage("backtest"):
+    predictions = tree_backtest("xgboost", df, params=params)
+metrics = holdout_metrics(predictions)
 
-# ✅ Create Features
-df["year"] = df["ds"].dt.year
-df["month"] = df["ds"].dt.month
-df["day"] = df["ds"].dt.day
-df["day_of_week"] = df["ds"].dt.dayofweek
+# ✅ Prediction Intervals (conformal quantiles of the same backtest residuals, stored with the version)
+intervals = calibrate_tree("xgboost", df, predictions=predictions)
+backtest_seconds = round(time.perf_counter() - backtest_started, 3)
 
-# ✅ Use Correct Features
-X = df[["year", "month", "day", "day_of_week", "Temperature", "Price"]]
-y = df["y"]
+# ✅ Train Model on the Full History with the tuned parameters (the registered version sees every day, including the most recent ones)
+started_at = time.perf_counter()
+xgb_model = xgb.XGBRegressor(**params)
+with stage("fit"):
+    xgb_model.fit(X, y)
 
-# ✅ Train Model
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-xgb_model = xgb.XGBRegressor(n_estimators=100, learning_rate=0.1, max_depth=5)
-xgb_model.fit(X_train, y_train)
+# ✅ Save Model (native format + metadata in the model registry, activated atomically)
+register("oracle_scm", xgb_model, df, features=pipeline.to_dict(), metrics=metrics, started_at=started_at, intervals=intervals, hyperparameters=params, backtest_seconds=backtest_seconds)
 
-# ✅ Save Model
-os.makedirs("models", exist_ok=True)
-with open(MODEL_PATH, "wb") as f:
-    pickle.dump(xgb_model, f)
+# ✅ Precompute the 365-day forecast so the dashboard and predict.py only slice it
+precompute("oracle_scm")
 
 print("✅ Oracle SCM (XGBoost) Model Trained and Saved.")
@@ -0,0 +1,270 @@
+import argparse
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from model_registry import MODELS
+
+# Get Paths
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PIPELINE_DIR = os.path.join(BASE_DIR, "data", "pipeline")
+STATE_PATH = os.path.join(PIPELINE_DIR, "state.json")
+LOG_DIR = os.path.join(PIPELINE_DIR, "logs")
+
+MAX_WORKERS = 3
+HASH_CHUNK = 1 << 20
+
+# 📌 Inputs are glob patterns relative to the project root; every source the loaders may read is listed
+# (CSV, Parquet store, Arrow files) so whichever one exists is hashed
+SALES_INPUTS = ["data/dairy_forecast_data.csv", "data/store/sales/year=*/*.parquet", "data/arrow/sales.arrow"]
+EXTERNAL_INPUTS = ["data/external_factors.csv", "data/store/external/year=*/*.parquet", "data/arrow/external.arrow"]
+TRAINING_CODE = ["src/dataset_store.py", "src/features.py", "src/model_registry.py", "src/forecast_cache.py", "src/intervals.py"]
+
+
+def _training_stage(name, inputs):
+    # Output is the registry's ACTIVE pointer: it moves on every successful training
+    return {
+        "script": os.path.relpath(MODELS[name]["script"], BASE_DIR),
+        "inputs": [*inputs, *TRAINING_CODE],
+        "outputs": [f"models/registry/{name}/ACTIVE"],
+    }
+
+
+# 📌 Pipeline Stages: script, declared inputs and outputs; dependencies are inferred (a stage depends on the stages
+# producing its inputs). "bootstrap" stages create the demo data only when it is missing, so real data that replaced
+# the CSVs is never overwritten by a regenerated sample (use --force to regenerate it anyway).
+STAGES = {
+    "sales_data": {"script": "data/generate_dataset.py", "inputs": [], "outputs": ["data/dairy_forecast_data.csv"], "bootstrap": True},
+    "external_data": {"script": "src/generate_external_data.py", "inputs": [], "outputs": ["data/external_factors.csv"], "bootstrap": True},
+    "seasonality": {"script": "src/seasonality_analysis.py", "inputs": [], "outputs": ["data/dairy_seasonality.csv", "data/dairy_seasonality.html"]},
+    "train_prophet": _training_stage("prophet", SALES_INPUTS),
+    "train_sap_ibp": _training_stage("sap_ibp", [*SALES_INPUTS, *EXTERNAL_INPUTS, "src/backtest.py", "src/tuning.py", "data/tuning/lightgbm.json"]),
+    "train_oracle_scm": _training_stage("oracle_scm", [*SALES_INPUTS, *EXTERNAL_INPUTS, "src/backtest.py", "src/tuning.py", "data/tuning/xgboost.json"]),
+}
+
+_print_lock = threading.Lock()
+
+
+def dependencies(stages=STAGES):
+    deps = {}
+    for name, spec in stages.items():
+        deps[name] = [
+            other for other, other_spec in stages.items()
+            if other != name and any(fnmatch.fnmatch(output, pattern) for output in other_spec["outputs"] for pattern in spec["inputs"])
+        ]
+    return deps
+
+
+def with_upstream(targets, deps):
+    selected, stack = set(), list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(deps[name])
+    return selected
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"stages": {}, "files": {}}
+
+
+def save_state(state, path=STATE_PATH):
+    # ✅ Written after every finished stage, atomically: a crash or a failed stage never loses completed work
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _expand(patterns):
+    paths = set()
+    for pattern in patterns:
+        paths.update(os.path.relpath(p, BASE_DIR) for p in glob.glob(os.path.join(BASE_DIR, pattern)) if os.path.isfile(p))
+    return sorted(paths)
+
+
+def _file_hash(path, files):
+    # Content hash, reused while size and mtime are unchanged so large stores aren't re-read on every run
+    stat = os.stat(os.path.join(BASE_DIR, path))
+    signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+    cached = files.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(os.path.join(BASE_DIR, path), "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    files[path] = [signature, digest.hexdigest()]
+    return files[path][1]
+
+
+def fingerprint(patterns, files, exclude=()):
+    digest = hashlib.sha256()
+    for path in _expand(patterns):
+        if path in exclude:
+            continue
+        digest.update(f"{path}:{_file_hash(path, files)}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def input_fingerprint(name, files):
+    # Script + inputs; a stage's own outputs never count as its inputs, even when a pattern matches them
+    spec = STAGES[name]
+    return fingerprint([spec["script"], *spec["inputs"]], files, exclude=set(_expand(spec["outputs"])))
+
+
+def stale_reason(name, state, force=False):
+    # None when the stage can be skipped, otherwise why it has to run
+    spec = STAGES[name]
+    files = state["files"]
+    if force:
+        return "forzado"
+    missing = [output for output in spec["outputs"] if not _expand([output])]
+    if missing:
+        return f"falta {', '.join(missing)}"
+    if spec.get("bootstrap"):
+        return None
+    record = state["stages"].get(name)
+    if record is None:
+        return "sin ejecuciones previas"
+    if record["inputs"] != input_fingerprint(name, files):
+        return "entradas modificadas"
+    if record["outputs"] != fingerprint(spec["outputs"], files):
+        return "salidas modificadas"
+    return None
+
+
+def _log(name, message):
+    with _print_lock:
+        print(f"[{name}] {message}", flush=True)
+
+
+def run_stage(name):
+    spec = STAGES[name]
+    os.makedirs(LOG_DIR, exist_ok=True)
+    started = time.perf_counter()
+    with open(os.path.join(LOG_DIR, f"{name}.log"), "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-u", os.path.join(BASE_DIR, spec["script"])], cwd=BASE_DIR,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1,
+        )
+        for line in process.stdout:
+            log.write(line)
+            if line.strip():
+                _log(name, line.rstrip())
+        returncode = process.wait()
+    return returncode, time.perf_counter() - started
+
+
+def run_pipeline(targets=None, force=None, workers=MAX_WORKERS, dry_run=False):
+    # `force`: None = nothing forced, empty = every selected stage except bootstrap ones, otherwise those stages
+    deps = dependencies()
+    selected = with_upstream(targets or list(STAGES), deps)
+    if force is not None and not force:
+        forced = {name for name in selected if not STAGES[name].get("bootstrap")}
+    else:
+        forced = set(force or ())
+    state = load_state()
+    results, running = {}, {}
+    pending = [name for name in STAGES if name in selected]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline-stage") as executor:
+        while pending or running:
+            for name in list(pending):
+                upstream = [results.get(dep) for dep in deps[name]]
+                if None in upstream:
+                    continue
+                pending.remove(name)
+                if any(status in ("failed", "blocked") for status in upstream):
+                    results[name] = "blocked"
+                    _log(name, "⏭️ bloqueada: una etapa previa falló")
+                    continue
+                if dry_run and "planned" in upstream:
+                    results[name] = "planned"
+                    _log(name, "🔄 se ejecutaría: depende de etapas que se ejecutarán")
+                    continue
+                # ✅ Hashes are taken only now, after every upstream stage finished writing its outputs
+                reason = stale_reason(name, state, name in forced)
+                if reason is None:
+                    results[name] = "skipped"
+                    _log(name, "✅ al día, se omite")
+                    continue
+                if dry_run:
+                    results[name] = "planned"
+                    _log(name, f"🔄 se ejecutaría ({reason})")
+                    continue
+                inputs = input_fingerprint(name, state["files"])
+                _log(name, f"🔄 ejecutando ({reason})")
+                running[executor.submit(run_stage, name)] = (name, inputs)
+
+            if not running:
+                continue
+            # Independent stages (e.g. the three trainings) run side by side; the next ready ones start as soon as one ends
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, inputs = running.pop(future)
+                try:
+                    returncode, seconds = future.result()
+                except OSError as exc:
+                    returncode, seconds = None, 0.0
+                    _log(name, f"❌ {exc}")
+                if returncode != 0:
+                    results[name] = "failed"
+                    _log(name, f"❌ falló (código {returncode}), registro en {os.path.join(LOG_DIR, f'{name}.log')}")
+                    continue
+                results[name] = "succeeded"
+                state["stages"][name] = {
+                    "inputs": inputs,
+                    "outputs": fingerprint(STAGES[name]["outputs"], state["files"]),
+                    "seconds": round(seconds, 2),
+                    "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                }
+                save_state(state)
+                _log(name, f"✅ completada en {seconds:.1f}s")
+    save_state(state)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline completo (datos, estacionalidad, entrenamientos) como DAG con reejecución incremental.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Ejecuta las etapas desactualizadas (y las previas que necesiten)")
+    run_parser.add_argument("stages", nargs="*", help=f"Etapas objetivo: {', '.join(STAGES)} (por defecto todas)")
+    run_parser.add_argument("--force", nargs="*", metavar="STAGE", help="Reejecutar aunque estén al día (sin nombres: todas las seleccionadas salvo los datos de ejemplo)")
+    run_parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    run_parser.add_argument("--dry-run", action="store_true", help="Solo mostrar qué se ejecutaría")
+    subparsers.add_parser("status", help="Estado de cada etapa y sus dependencias")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        state, deps = load_state(), dependencies()
+        for name in STAGES:
+            reason = stale_reason(name, state)
+            record = state["stages"].get(name, {})
+            after = f" ← {', '.join(deps[name])}" if deps[name] else ""
+            print(f"{'✅' if reason is None else '🔄'} {name}{after}: {reason or 'al día'}" + (f" (última: {record['finished_at']}, {record['seconds']}s)" if record else ""))
+        sys.exit(0)
+
+    unknown = [name for name in [*args.stages, *(args.force or [])] if name not in STAGES]
+    if unknown:
+        parser.error(f"etapas desconocidas: {', '.join(unknown)}")
+    started = time.perf_counter()
+    results = run_pipeline(args.stages, args.force, args.workers, args.dry_run)
+    print(f"\n📋 Resumen ({time.perf_counter() - started:.1f}s):")
+    for name, status in results.items():
+        print(f"  {name}: {status}")
+    sys.exit(1 if any(status in ("failed", "blocked") for status in results.values()) else 0)
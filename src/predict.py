@@ -1,14 +1,20 @@
-import pickle
-import pandas as pd
+import argparse
 
-# Cargar modelo entrenado
-with open("trained_model.pkl", "rb") as f:
-    model = pickle.load(f)
+from forecast_cache import MAX_HORIZON, load_forecast
+from model_registry import MODELS, model_token
 
-# Generar predicciones para los próximos 90 días
-future = model.make_future_dataframe(periods=90)
-forecast = model.predict(future)
+# 📌 Inferencia ligera: solo lectura del pronóstico precalculado (sin Prophet, Stan ni librerías de árboles). Si la
+# versión o los datos cambiaron se calcula una vez importando únicamente la librería del modelo elegido.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pronóstico de la versión activa de un modelo, desde la caché precalculada.")
+    parser.add_argument("--model", default="prophet", choices=list(MODELS))
+    parser.add_argument("--horizon", type=int, default=90, help=f"Días a pronosticar (1-{MAX_HORIZON})")
+    parser.add_argument("--output", default="dairy_forecast_predictions.csv")
+    args = parser.parse_args()
 
-# Guardar predicciones
-forecast.to_csv("dairy_forecast_predictions.csv", index=False)
-print("✅ Pronóstico generado y guardado.")
+    # Recorte del pronóstico a 365 días precalculado tras el entrenamiento
+    forecast = load_forecast(args.model, horizon=args.horizon)
+
+    # Guardar predicciones
+    forecast.to_csv(args.output, index=False)
+    print(f"✅ Pronóstico generado y guardado (modelo {model_token(args.model)}).")
@@ -0,0 +1,125 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset_store import load_external, load_history
+from intervals import tree_intervals
+from model_registry import MODELS, feature_pipeline, load_model
+
+# Get Paths
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_DIR = os.path.join(BASE_DIR, "data", "scenarios")
+
+# 📌 What-If Scenarios: Temperature/Price paths stacked into one feature matrix and one predict call
+PRICE_BASE_DAYS = 28             # baseline price = mean of the last 4 weeks
+DEFAULT_PRICE_CHANGES = (-0.2, -0.1, 0.0, 0.1, 0.2)
+LEAP_MONTH_STARTS = np.cumsum([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+
+
+class ScenarioForecast:
+    def __init__(self, dates, scenarios, yhat, yhat_lower, yhat_upper):
+        # Cube arrays are (scenario, date); `scenarios` has one row of labels per scenario
+        self.dates = dates
+        self.scenarios = scenarios
+        self.yhat = yhat
+        self.yhat_lower = yhat_lower
+        self.yhat_upper = yhat_upper
+
+    def totals(self):
+        return self.scenarios.assign(total=self.yhat.sum(axis=1))
+
+    def to_frame(self):
+        n_scenarios, days = self.yhat.shape
+        frame = self.scenarios.loc[np.repeat(np.arange(n_scenarios), days)].reset_index(drop=True)
+        frame["ds"] = np.tile(self.dates.to_numpy(), n_scenarios)
+        frame["yhat"] = self.yhat.ravel()
+        frame["yhat_lower"] = self.yhat_lower.ravel()
+        frame["yhat_upper"] = self.yhat_upper.ravel()
+        return frame
+
+
+def weather_paths(dates, external=None):
+    # One Temperature path per historical year: that year's readings on the same days of the year
+    external = load_external(columns=["ds", "Temperature"]) if external is None else external
+    if external is None:
+        return [], np.empty((0, len(dates)))
+    external = external.dropna(subset=["Temperature"])
+    external = external.assign(year=external["ds"].dt.year, slot=calendar_slots(external["ds"]))
+    table = external.pivot_table(index="year", columns="slot", values="Temperature")
+    # Days missing in a year (Feb 29 of non-leap years, gaps) are interpolated along the year
+    table = table.reindex(columns=range(366)).interpolate(axis=1, limit_direction="both").dropna()
+    paths = table.to_numpy()[:, calendar_slots(dates)]
+    return [f"clima {year}" for year in table.index], paths
+
+
+def calendar_slots(dates):
+    # (month, day) -> position on a 366-day leap calendar, so Mar 1 and Dec 31 line up in every year and
+    # Feb 29 has its own slot (dayofyear shifts every day after Feb 28 by one in leap years)
+    dates = pd.DatetimeIndex(dates)
+    return LEAP_MONTH_STARTS[dates.month.to_numpy() - 1] + dates.day.to_numpy() - 1
+
+
+def price_paths(history, dates, changes=DEFAULT_PRICE_CHANGES):
+    # Flat price paths: the recent baseline price moved by each relative change
+    base = history["Price"].dropna().tail(PRICE_BASE_DAYS).mean() if "Price" in history.columns else np.nan
+    if np.isnan(base):
+        raise ValueError("❌ No hay precios en el historial para construir escenarios de precio")
+    changes = np.asarray(changes, dtype=np.float64)
+    return [f"precio {change:+.0%}" for change in changes], np.outer(base * (1 + changes), np.ones(len(dates)))
+
+
+def scenario_grid(**paths):
+    # Cartesian product of the labelled paths per column: grid(Temperature=(labels, (T, D)), Price=(labels, (P, D)))
+    columns = list(paths)
+    counts = [len(labels) for labels, _ in paths.values()]
+    index = np.indices(counts).reshape(len(columns), -1)
+    scenarios = pd.DataFrame({col: np.asarray(paths[col][0], dtype=object)[idx] for col, idx in zip(columns, index)})
+    exogenous = {col: np.asarray(paths[col][1])[idx] for col, idx in zip(columns, index)}
+    return scenarios, exogenous
+
+
+def forecast_scenarios(name, history, days, scenarios, exogenous, model=None, metadata=None):
+    if MODELS[name]["kind"] == "prophet":
+        raise ValueError("❌ Prophet no usa Temperatura/Precio; los escenarios requieren LightGBM o XGBoost")
+    if model is None:
+        model, metadata = load_model(name)
+    pipeline = feature_pipeline(metadata, history)
+    dates, base = pipeline.future_features(history, days)
+
+    # ✅ Calendar, holiday and lag features are computed once and tiled; only exogenous columns differ per scenario
+    n_scenarios = len(scenarios)
+    X = np.tile(base.to_numpy(dtype=np.float64), (n_scenarios, 1))
+    for col, values in exogenous.items():
+        if col in pipeline.exogenous:
+            values = np.broadcast_to(np.asarray(values, dtype=np.float64), (n_scenarios, days))
+            X[:, base.columns.get_loc(col)] = np.where(np.isnan(values), pipeline.fill_values.get(col, 0.0), values).ravel()
+
+    yhat = np.asarray(model.predict(pd.DataFrame(X, columns=base.columns)), dtype=np.float64).reshape(n_scenarios, days)
+    lower, upper = tree_intervals(yhat, metadata.get("intervals"))
+    return ScenarioForecast(dates, scenarios.reset_index(drop=True), yhat, lower, upper)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pronóstico por escenarios (what-if) de Temperatura y Precio en una sola predicción.")
+    parser.add_argument("model", choices=[name for name in MODELS if MODELS[name]["kind"] != "prophet"])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--price-changes", nargs="+", type=float, default=list(DEFAULT_PRICE_CHANGES), help="Cambios relativos de precio, p. ej. -0.1 0 0.1")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    history = load_history()
+    dates = pd.date_range(start=history["ds"].max() + pd.Timedelta(days=1), periods=args.days, freq="D")
+    weather = weather_paths(dates)
+    paths = {"Price": price_paths(history, dates, args.price_changes)}
+    if weather[0]:
+        paths["Temperature"] = weather
+    scenarios, exogenous = scenario_grid(**paths)
+    forecast = forecast_scenarios(args.model, history, args.days, scenarios, exogenous)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"{args.model}_scenarios.csv")
+    forecast.to_frame().to_csv(path, index=False)
+    print(forecast.totals().sort_values("total").to_string(index=False))
+    print(f"✅ {len(scenarios)} escenarios × {args.days} días guardados en: {path}")
@@ -0,0 +1,352 @@
+import argparse
+import bisect
+import functools
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from dataset_store import load_history, source_signature
+from forecast_cache import MAX_HORIZON
+from intervals import prophet_forecast, tree_intervals
+from model_registry import MODELS, check_series, feature_pipeline, load_model, model_token, token_version
+
+# 📌 Micro-Batching: requests arriving within one window are answered by a single predict per model
+BATCH_WINDOW_SECONDS = 0.002
+MAX_BATCH = 256
+DEFAULT_HORIZON = 90
+CONTEXT_CACHE_SIZE = 64
+REQUEST_TIMEOUT_SECONDS = 30
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.buckets_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation (inf past the last bucket)
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip((*self.buckets_ms, float("inf")), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "buckets_ms": {
+                **{f"le_{bound}": count for bound, count in zip(self.buckets_ms, self.counts)}, "le_inf": self.counts[-1],
+            },
+        }
+
+
+class ServingMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {"requests": 0, "errors": 0, "forecasts": 0, "batches": 0, "predict_calls": 0, "rows_predicted": 0}
+        self.histograms = {"request": LatencyHistogram(), "queue": LatencyHistogram(), "predict": LatencyHistogram()}
+        self.request_by_status = {}
+
+    def increment(self, counter, value=1):
+        with self._lock:
+            self.counters[counter] += value
+
+    def observe(self, histogram, seconds, status=None):
+        with self._lock:
+            self.histograms[histogram].observe(seconds)
+            if status is not None:
+                self.request_by_status.setdefault(str(status), LatencyHistogram()).observe(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            uptime = time.time() - self.started_at
+            return {
+                "uptime_seconds": round(uptime, 1),
+                "counters": dict(self.counters),
+                "throughput_per_second": {
+                    name: round(self.counters[name] / max(uptime, 1e-9), 2) for name in ("requests", "forecasts", "rows_predicted")
+                },
+                "mean_batch_size": round(self.counters["forecasts"] / self.counters["batches"], 2) if self.counters["batches"] else None,
+                "latency": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+                "request_latency_by_status": {status: histogram.snapshot() for status, histogram in sorted(self.request_by_status.items())},
+            }
+
+
+class ForecastRequest:
+    def __init__(self, name, horizon, series_id=None):
+        self.name = name
+        self.horizon = horizon
+        self.series_id = series_id
+        self.submitted_at = time.perf_counter()
+        self.future = Future()
+
+
+class ForecastContext:
+    # Everything about one (model version, series, data) that does not depend on the request:
+    # future dates and the feature rows for the longest horizon, built once and sliced per request
+    def __init__(self, version, dates, features):
+        self.version = version
+        self.dates = dates
+        self.features = features
+
+
+def _load(name, token):
+    # Load exactly the version named by the token, so a concurrent activation can't pair a model with another's cache key
+    return load_model(name, token_version(token))
+
+
+@functools.lru_cache(maxsize=CONTEXT_CACHE_SIZE)
+def forecast_context(name, token, series_id, sales_signature, external_signature):
+    # Keyed on the data signatures too, so new sales days or external factors rebuild the context
+    _, metadata = _load(name, token)
+    history = load_history(series_id=series_id).dropna(subset=["y"]).reset_index(drop=True)
+    if history.empty:
+        raise LookupError(f"❌ No hay historial para la serie {series_id}")
+    if MODELS[name]["kind"] == "prophet":
+        dates = pd.date_range(start=history["ds"].max() + pd.Timedelta(days=1), periods=MAX_HORIZON, freq="D")
+        features = pd.DataFrame({"ds": dates})
+    else:
+        dates, features = feature_pipeline(metadata, history).future_features(history, MAX_HORIZON)
+    return ForecastContext(metadata["version"], [str(day.date()) for day in dates], features)
+
+
+class ForecastService:
+    def __init__(self, models=None, batch_window=BATCH_WINDOW_SECONDS, max_batch=MAX_BATCH):
+        self.models = list(models or MODELS)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.metrics = ServingMetrics()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._batch_loop, name="forecast-batcher", daemon=True)
+        self._worker.start()
+
+    def preload(self):
+        # ✅ Models and aggregate-series contexts are loaded before the first request, not on it
+        signatures = (source_signature("sales"), source_signature("external"))
+        for name in self.models:
+            context = forecast_context(name, model_token(name), None, *signatures)
+            print(f"✅ {name}: modelo {context.version} precargado.")
+
+    def submit(self, name, horizon=DEFAULT_HORIZON, series_id=None):
+        if name not in self.models:
+            raise ValueError(f"❌ Modelo no disponible: {name}")
+        if not isinstance(horizon, int) or not 1 <= horizon <= MAX_HORIZON:
+            raise ValueError(f"❌ El horizonte debe ser un entero entre 1 y {MAX_HORIZON}")
+        # Every registry model is trained on the aggregate: a series id would get an aggregate-scale forecast
+        check_series(name, series_id)
+        request = ForecastRequest(name, horizon, None if series_id is None else str(series_id))
+        self._queue.put(request)
+        return request.future
+
+    def forecast(self, name, horizon=DEFAULT_HORIZON, series_id=None, timeout=REQUEST_TIMEOUT_SECONDS):
+        return self.submit(name, horizon, series_id).result(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def _batch_loop(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.perf_counter() + self.batch_window
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    request = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        for request in batch:
+            self.metrics.observe("queue", started - request.submitted_at)
+        self.metrics.increment("batches")
+        self.metrics.increment("forecasts", len(batch))
+
+        # Data signatures are checked once per batch, not once per request
+        signatures = (source_signature("sales"), source_signature("external"))
+        groups = {}
+        for request in batch:
+            groups.setdefault(request.name, []).append(request)
+        for name, requests in groups.items():
+            try:
+                self._predict_group(name, requests, signatures)
+            except Exception as exc:
+                for request in requests:
+                    if not request.future.done():
+                        request.future.set_exception(exc)
+
+    def _predict_group(self, name, requests, signatures):
+        token = model_token(name)
+        model, metadata = _load(name, token)
+        is_prophet = MODELS[name]["kind"] == "prophet"
+
+        # ✅ One feature block per distinct series, cut at the longest horizon asked for it in this batch
+        contexts, horizons, failed = {}, {}, {}
+        for request in requests:
+            if request.series_id in failed:
+                request.future.set_exception(failed[request.series_id])
+                continue
+            if request.series_id not in contexts:
+                # A bad series (unknown id, no history) fails only its own requests; the rest are still predicted together
+                try:
+                    contexts[request.series_id] = forecast_context(name, token, request.series_id, *signatures)
+                except Exception as exc:
+                    failed[request.series_id] = exc
+                    request.future.set_exception(exc)
+                    continue
+            horizons[request.series_id] = max(horizons.get(request.series_id, 0), request.horizon)
+        requests = [request for request in requests if request.series_id in contexts]
+        if not requests:
+            return
+        keys = list(contexts)
+        blocks = [contexts[key].features.iloc[:horizons[key]] for key in keys]
+
+        started = time.perf_counter()
+        frame = pd.concat(blocks, ignore_index=True) if len(blocks) > 1 else blocks[0]
+        predictions = prophet_forecast(model, frame) if is_prophet else model.predict(frame)
+        self.metrics.observe("predict", time.perf_counter() - started)
+        self.metrics.increment("predict_calls")
+        self.metrics.increment("rows_predicted", sum(len(block) for block in blocks))
+
+        if is_prophet:
+            yhat, lower, upper = (predictions[col].to_numpy() for col in ("yhat", "yhat_lower", "yhat_upper"))
+        else:
+            yhat = np.asarray(predictions, dtype=np.float64)
+            lower, upper = tree_intervals(yhat, metadata.get("intervals"))
+        offsets = dict(zip(keys, np.cumsum([0] + [len(block) for block in blocks[:-1]])))
+
+        for request in requests:
+            context, start = contexts[request.series_id], offsets[request.series_id]
+            end = start + request.horizon
+            request.future.set_result({
+                "model": name,
+                "version": context.version,
+                "series_id": request.series_id,
+                "horizon": request.horizon,
+                "ds": context.dates[:request.horizon],
+                "yhat": yhat[start:end].tolist(),
+                "yhat_lower": lower[start:end].tolist(),
+                "yhat_upper": upper[start:end].tolist(),
+            })
+
+
+# 📌 HTTP Front End (stdlib threading server: one thread per connection, all feeding the same batcher)
+class ForecastHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Per-request access logs would dominate latency at high request rates; /metrics covers it
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/health":
+            self._send(200, {"status": "ok", "models": service.models})
+        elif self.path == "/metrics":
+            self._send(200, service.metrics.snapshot())
+        else:
+            self._send(404, {"error": f"Ruta desconocida: {self.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path != "/forecast":
+            return self._send(404, {"error": f"Ruta desconocida: {self.path}"})
+        started = time.perf_counter()
+        service.metrics.increment("requests")
+        status = 500
+        try:
+            status, body = self._forecast(service)
+            self._send(status, body)
+        finally:
+            # Rejected and failed requests are timed too, labelled by status, so slow errors show up in /metrics
+            service.metrics.observe("request", time.perf_counter() - started, status)
+
+    def _forecast(self, service):
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            # A single {"model", "horizon", "series_id"} object or {"requests": [...]} for many series at once
+            items = payload["requests"] if "requests" in payload else [payload]
+            futures = [service.submit(item["model"], item.get("horizon", DEFAULT_HORIZON), item.get("series_id")) for item in items]
+            results = [future.result(REQUEST_TIMEOUT_SECONDS) for future in futures]
+        except (KeyError, TypeError, ValueError) as exc:
+            service.metrics.increment("errors")
+            return 400, {"error": str(exc)}
+        except LookupError as exc:
+            # Unknown series id
+            service.metrics.increment("errors")
+            return 404, {"error": str(exc)}
+        except Exception as exc:
+            service.metrics.increment("errors")
+            return 500, {"error": str(exc)}
+        return 200, {"forecasts": results} if "requests" in payload else results[0]
+
+
+def serve(service, host="127.0.0.1", port=8000):
+    server = ThreadingHTTPServer((host, port), ForecastHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"🚀 Servicio de pronóstico en http://{host}:{port} (POST /forecast, GET /metrics, GET /health)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio HTTP de pronósticos con modelos precargados y micro-batching.")
+    parser.add_argument("--models", nargs="+", default=list(MODELS), choices=list(MODELS))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_SECONDS * 1000)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    args = parser.parse_args()
+
+    service = ForecastService(args.models, args.batch_window_ms / 1000, args.max_batch)
+    service.preload()
+    serve(service, args.host, args.port)
@@ -0,0 +1,175 @@
+import argparse
+import collections
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dataset_store import source_signature
+from model_registry import MODELS
+
+# Get Paths
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+INCREMENTAL_SCRIPT = os.path.join(BASE_DIR, "src", "incremental.py")
+
+MAX_WORKERS = 2
+LOG_LINES = 500
+CANCEL_GRACE_SECONDS = 5
+ACTIVE_STATUSES = ("queued", "running")
+# 📌 Finished jobs (and their logs) are kept for a while so sessions can show the result, then evicted:
+# the queue lives as long as the dashboard process
+FINISHED_TTL_SECONDS = 3600
+MAX_FINISHED_JOBS = 20
+
+
+class TrainingJob:
+    def __init__(self, name, mode, key, log_lines=LOG_LINES):
+        self.id = uuid.uuid4().hex[:8]
+        self.name = name
+        self.mode = mode
+        self.key = key
+        self.status = "queued"
+        self.progress = "En cola"
+        # ✅ Bounded ring buffer: memory and render cost stay constant however long the log gets
+        self.logs = collections.deque(maxlen=log_lines)
+        self.returncode = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.process = None
+        self.future = None
+
+    @property
+    def done(self):
+        return self.status not in ACTIVE_STATUSES
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def command(self):
+        if self.mode == "incremental":
+            return [sys.executable, "-u", INCREMENTAL_SCRIPT, self.name]
+        return [sys.executable, "-u", MODELS[self.name]["script"]]
+
+    def snapshot(self):
+        return {
+            "id": self.id, "name": self.name, "mode": self.mode, "status": self.status, "progress": self.progress,
+            "returncode": self.returncode, "elapsed": round(self.elapsed, 2), "logs": list(self.logs),
+        }
+
+
+class JobQueue:
+    def __init__(self, max_workers=MAX_WORKERS, log_lines=LOG_LINES, finished_ttl=FINISHED_TTL_SECONDS, max_finished=MAX_FINISHED_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="training-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._log_lines = log_lines
+        self._finished_ttl = finished_ttl
+        self._max_finished = max_finished
+
+    def submit(self, name, mode="full"):
+        if name not in MODELS:
+            raise ValueError(f"❌ Modelo desconocido: {name}")
+        # ✅ Identical job = same model, mode and input data; while one is active, callers share it
+        key = (name, mode, source_signature("sales"), source_signature("external"))
+        with self._lock:
+            self._evict()
+            for job in self._jobs.values():
+                if job.key == key and not job.done:
+                    return job
+            job = TrainingJob(name, mode, key, self._log_lines)
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            self._evict()
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def _evict(self):
+        # Caller holds the lock; active jobs are never evicted
+        now = time.time()
+        finished = sorted((job for job in self._jobs.values() if job.done), key=lambda job: job.finished_at or job.created_at, reverse=True)
+        for rank, job in enumerate(finished):
+            if rank >= self._max_finished or now - (job.finished_at or job.created_at) > self._finished_ttl:
+                del self._jobs[job.id]
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return False
+        job.cancel_requested = True
+        if job.future.cancel():
+            self._finish(job, "cancelled", "Cancelado antes de iniciar")
+            return True
+        process = job.process
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=CANCEL_GRACE_SECONDS)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        return True
+
+    def _finish(self, job, status, progress):
+        job.status = status
+        job.progress = progress
+        job.finished_at = time.time()
+
+    def _run(self, job):
+        if job.cancel_requested:
+            return self._finish(job, "cancelled", "Cancelado antes de iniciar")
+        job.status = "running"
+        job.progress = "Iniciando..."
+        job.started_at = time.time()
+        try:
+            job.process = subprocess.Popen(
+                job.command(), cwd=BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1,
+            )
+            if job.cancel_requested:
+                job.process.terminate()
+            for line in job.process.stdout:
+                line = line.rstrip()
+                if line:
+                    job.logs.append(line)
+                    job.progress = line
+            job.returncode = job.process.wait()
+        except Exception as exc:
+            job.logs.append(f"❌ {exc}")
+            return self._finish(job, "failed", "Error al lanzar el entrenamiento")
+
+        if job.cancel_requested:
+            self._finish(job, "cancelled", "Cancelado")
+        elif job.returncode == 0:
+            self._finish(job, "succeeded", "Completado")
+        else:
+            self._finish(job, "failed", f"Falló (código {job.returncode})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entrena varios modelos en paralelo con la cola de trabajos.")
+    parser.add_argument("models", nargs="*", default=list(MODELS), help=f"Modelos a entrenar: {', '.join(MODELS)}")
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+
+    queue = JobQueue(max_workers=args.workers)
+    jobs = [queue.submit(name, "incremental" if args.incremental else "full") for name in args.models]
+    while not all(job.done for job in jobs):
+        time.sleep(1)
+    for job in jobs:
+        print(f"{'✅' if job.status == 'succeeded' else '❌'} {job.name} [{job.id}]: {job.status} en {job.elapsed:.1f}s")
+    sys.exit(0 if all(job.status == "succeeded" for job in jobs) else 1)
@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest import HORIZON, check_horizon, make_cutoffs, project_table
+from batch_forecast import SERIES_COL, exogenous_columns, forecast_global, load_long_table, tree_matrix
+from features import FeaturePipeline
+
+# Get Paths
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TUNING_DIR = os.path.join(BASE_DIR, "data", "tuning")
+
+# 📌 Search: successive halving over boosting rounds (one Hyperband bracket). Every rung trains the surviving trials
+# with native early stopping on time-ordered validation folds and keeps the best 1/eta for a budget eta times larger.
+N_TRIALS = 27
+ETA = 3
+MIN_ROUNDS = 50
+MAX_ROUNDS = 1000
+EARLY_STOPPING_ROUNDS = 25
+N_FOLDS = 3
+TOTAL = "total"
+
+# (kind of draw, low, high); names are the scikit-learn wrapper's, which both native APIs accept as aliases
+SEARCH_SPACES = {
+    "lightgbm": {
+        "learning_rate": ("log", 0.01, 0.3),
+        "num_leaves": ("int", 7, 127),
+        "max_depth": ("int", 3, 10),
+        "min_child_samples": ("int", 5, 100),
+        "subsample": ("float", 0.5, 1.0),
+        "colsample_bytree": ("float", 0.5, 1.0),
+        "reg_lambda": ("log", 1e-3, 10.0),
+    },
+    "xgboost": {
+        "learning_rate": ("log", 0.01, 0.3),
+        "max_depth": ("int", 3, 10),
+        "min_child_weight": ("log", 0.5, 20.0),
+        "subsample": ("float", 0.5, 1.0),
+        "colsample_bytree": ("float", 0.5, 1.0),
+        "reg_lambda": ("log", 1e-3, 10.0),
+    },
+}
+# ✅ Binning parameters are fixed for the whole search, so the binned datasets built once per worker stay valid
+# (LightGBM's feature_pre_filter would otherwise pin min_child_samples to the first trial's value)
+FIXED_PARAMS = {
+    "lightgbm": {"objective": "regression", "metric": "l1", "subsample_freq": 1, "max_bin": 255, "feature_pre_filter": False, "verbose": -1},
+    "xgboost": {"objective": "reg:squarederror", "eval_metric": "mae", "tree_method": "hist", "max_bin": 256},
+}
+
+
+def sample_params(kind, rng):
+    params = {}
+    for name, (draw, low, high) in SEARCH_SPACES[kind].items():
+        if draw == "log":
+            params[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        elif draw == "int":
+            params[name] = int(rng.integers(low, high + 1))
+        else:
+            params[name] = float(rng.uniform(low, high))
+    return params
+
+
+def validation_folds(df, n_folds=N_FOLDS, horizon=HORIZON):
+    # Expanding window, time-ordered: each fold trains up to its cutoff and validates on the next `horizon` days
+    check_horizon(horizon)
+    ds = df["ds"].to_numpy()
+    observed = ~np.isnan(df["y"].to_numpy(dtype=np.float64))
+    folds = []
+    for cutoff in make_cutoffs(df, n_folds, horizon):
+        cutoff = np.datetime64(cutoff)
+        train = observed & (ds <= cutoff)
+        valid = observed & (ds > cutoff) & (ds <= cutoff + np.timedelta64(horizon, "D"))
+        if train.any() and valid.any():
+            folds.append((train, valid))
+    return folds
+
+
+# 📌 Workers: each process bins every fold once (lgb.Dataset / xgb.QuantileDMatrix) and reuses it for all its trials
+_worker = {}
+
+
+def _init_worker(kind, X, y, folds, threads):
+    data = []
+    for train, valid in folds:
+        if kind == "lightgbm":
+            import lightgbm as lgb
+            train_set = lgb.Dataset(X[train], y[train], params=FIXED_PARAMS[kind], free_raw_data=False)
+            valid_set = lgb.Dataset(X[valid], y[valid], reference=train_set, free_raw_data=False)
+            train_set.construct()
+            valid_set.construct()
+        else:
+            import xgboost as xgb
+            train_set = xgb.QuantileDMatrix(X[train], y[train], enable_categorical=True, max_bin=FIXED_PARAMS[kind]["max_bin"])
+            valid_set = xgb.QuantileDMatrix(X[valid], y[valid], enable_categorical=True, ref=train_set)
+        data.append((train_set, valid_set))
+    _worker.update(kind=kind, data=data, threads=threads)
+
+
+def _run_trial(task):
+    params, budget, early_stopping = task
+    kind, threads = _worker["kind"], _worker["threads"]
+    scores, rounds = [], []
+    for train_set, valid_set in _worker["data"]:
+        if kind == "lightgbm":
+            import lightgbm as lgb
+            booster = lgb.train({**FIXED_PARAMS[kind], **params, "num_threads": threads}, train_set, num_boost_round=budget,
+                                valid_sets=[valid_set], callbacks=[lgb.early_stopping(early_stopping, verbose=False)])
+            scores.append(booster.best_score["valid_0"]["l1"])
+            rounds.append(booster.best_iteration or budget)
+        else:
+            import xgboost as xgb
+            booster = xgb.train({**FIXED_PARAMS[kind], **params, "nthread": threads}, train_set, num_boost_round=budget,
+                                evals=[(valid_set, "valid")], early_stopping_rounds=early_stopping, verbose_eval=False)
+            scores.append(booster.best_score)
+            rounds.append(booster.best_iteration + 1)
+    return float(np.mean(scores)), int(round(np.mean(rounds))), int(max(rounds))
+
+
+def successive_halving(kind, X, y, folds, n_trials=N_TRIALS, eta=ETA, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS,
+                       early_stopping=EARLY_STOPPING_ROUNDS, max_workers=None, seed=42):
+    rng = np.random.default_rng(seed)
+    trials = [{"trial": i, "params": sample_params(kind, rng)} for i in range(n_trials)]
+    workers = max(1, min(max_workers or os.cpu_count(), n_trials))
+    threads = max(1, os.cpu_count() // workers)
+    history, alive, budget, rung = [], trials, min_rounds, 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(kind, X, y, folds, threads)) as executor:
+        while True:
+            # ✅ Pruning: a trial whose every fold early-stopped inside the previous budget has converged, so a
+            # larger budget can't change it; it keeps its score without being retrained
+            pending = [trial for trial in alive if "budget" not in trial or trial["best_rounds"] + early_stopping > trial["budget"]]
+            results = executor.map(_run_trial, [(trial["params"], budget, early_stopping) for trial in pending])
+            for trial, (score, rounds, best_rounds) in zip(pending, results):
+                trial.update(score=score, rounds=rounds, best_rounds=best_rounds, budget=budget)
+            history.extend({"rung": rung, "budget": budget, "trial": trial["trial"], "score_mae": trial["score"],
+                            "rounds": trial["rounds"], **trial["params"]} for trial in pending)
+            alive = sorted(alive, key=lambda trial: trial["score"])
+            if budget >= max_rounds or len(alive) <= 1:
+                break
+            alive = alive[:max(1, len(alive) // eta)]
+            budget, rung = min(budget * eta, max_rounds), rung + 1
+    return alive[0], pd.DataFrame(history)
+
+
+def tune(df, kind, segments=None, n_folds=N_FOLDS, horizon=HORIZON, **search):
+    # `segments` maps series_id -> segment label; each segment gets its own search (default: all series pooled)
+    labels = pd.Series(TOTAL, index=df[SERIES_COL].unique()) if segments is None else segments
+    results, histories = {}, []
+    for segment, members in labels.groupby(labels, sort=True):
+        frame = df[df[SERIES_COL].isin(members.index)].reset_index(drop=True)
+        folds = validation_folds(frame, n_folds, horizon)
+        if not folds:
+            print(f"⚠ {segment}: historial insuficiente para {n_folds} cortes de {horizon} días, se omite.")
+            continue
+        started = time.perf_counter()
+        # ✅ One feature matrix per segment (lags only look >= 365 days back); fill statistics from before the first cutoff
+        first_train = folds[0][0]
+        pipeline = FeaturePipeline(exogenous=exogenous_columns(frame)).fit(frame[first_train])
+        X = tree_matrix(pipeline, frame, np.sort(frame[SERIES_COL].unique()))
+        y = frame["y"].to_numpy(dtype=np.float64)
+        best, history = successive_halving(kind, X, y, folds, **search)
+        seconds = time.perf_counter() - started
+        results[str(segment)] = {
+            "params": best["params"], "n_estimators": best["rounds"], "score_mae": best["score"],
+            "series": int(len(members)), "folds": len(folds), "trials": int(history["trial"].nunique()),
+            "trainings": int(len(history)), "seconds": round(seconds, 2),
+        }
+        histories.append(history.assign(segment=segment))
+        print(f"✅ {kind} {segment}: MAE {best['score']:.3f} con {best['rounds']} árboles ({seconds:.1f}s)")
+    return results, (pd.concat(histories, ignore_index=True) if histories else pd.DataFrame())
+
+
+def tuning_path(kind, tuning_dir=TUNING_DIR):
+    return os.path.join(tuning_dir, f"{kind}.json")
+
+
+def save_tuning(kind, results, tuning_dir=TUNING_DIR):
+    # Newly tuned segments replace their previous entry; other segments are kept
+    path = tuning_path(kind, tuning_dir)
+    saved = load_tuning(kind, tuning_dir) or {"kind": kind, "segments": {}}
+    saved["segments"].update(results)
+    saved["updated_at"] = pd.Timestamp.now(tz="UTC").isoformat()
+    os.makedirs(tuning_dir, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(saved, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_tuning(kind, tuning_dir=TUNING_DIR):
+    try:
+        with open(tuning_path(kind, tuning_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def tuned_params(kind, segment=TOTAL, tuning_dir=TUNING_DIR):
+    # scikit-learn wrapper arguments of a tuned segment (LGBMRegressor / XGBRegressor), or None if never tuned
+    entry = (load_tuning(kind, tuning_dir) or {}).get("segments", {}).get(str(segment))
+    if entry is None:
+        return None
+    fixed = {"subsample_freq": 1} if kind == "lightgbm" else {}
+    return {**fixed, **entry["params"], "n_estimators": entry["n_estimators"]}
+
+
+def forecast_segments(df, kind, horizon, segments=None, future_exog=None, tuning_dir=TUNING_DIR):
+    # One pooled model per segment with that segment's tuned hyperparameters (defaults where it was never tuned)
+    labels = pd.Series(TOTAL, index=df[SERIES_COL].unique()) if segments is None else segments
+    forecasts, timings = [], []
+    for segment, members in labels.groupby(labels, sort=True):
+        frame = df[df[SERIES_COL].isin(members.index)].reset_index(drop=True)
+        exog = None if future_exog is None else future_exog[future_exog[SERIES_COL].isin(members.index)]
+        forecast, timing = forecast_global(frame, horizon, kind, exog, tuned_params(kind, segment, tuning_dir))
+        forecasts.append(forecast.assign(segment=segment))
+        timings.append(timing.assign(segment=segment))
+    return pd.concat(forecasts, ignore_index=True), pd.concat(timings, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Búsqueda de hiperparámetros (successive halving + early stopping) para LightGBM y XGBoost.")
+    parser.add_argument("input", nargs="?", help="CSV en formato largo (series_id, ds, y, exógenas); por defecto los datos del proyecto")
+    parser.add_argument("--models", nargs="+", default=["lightgbm", "xgboost"], choices=list(SEARCH_SPACES))
+    parser.add_argument("--segments", help="CSV con series_id y la columna de segmento (p. ej. la tabla de jerarquía)")
+    parser.add_argument("--segment-col", help="Columna de --segments que define cada segmento")
+    parser.add_argument("--per-series", action="store_true", help="Un segmento por serie")
+    parser.add_argument("--trials", type=int, default=N_TRIALS)
+    parser.add_argument("--eta", type=int, default=ETA)
+    parser.add_argument("--min-rounds", type=int, default=MIN_ROUNDS)
+    parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS)
+    parser.add_argument("--early-stopping", type=int, default=EARLY_STOPPING_ROUNDS)
+    parser.add_argument("--folds", type=int, default=N_FOLDS)
+    parser.add_argument("--horizon", type=int, default=HORIZON)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tuning-dir", default=TUNING_DIR)
+    parser.add_argument("--forecast", type=int, metavar="HORIZON", help="Tras la búsqueda, pronosticar cada segmento con su modelo ajustado")
+    args = parser.parse_args()
+    try:
+        check_horizon(args.horizon)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    df = load_long_table(args.input) if args.input else project_table()
+    segments = None
+    if args.per_series:
+        series = df[SERIES_COL].unique()
+        segments = pd.Series(series, index=series)
+    elif args.segments:
+        if not args.segment_col:
+            parser.error("--segments requiere --segment-col")
+        spec = pd.read_csv(args.segments, dtype=str).drop_duplicates(SERIES_COL)
+        segments = spec.set_index(SERIES_COL)[args.segment_col]
+        segments = segments[segments.index.isin(df[SERIES_COL].unique())]
+
+    search = {"n_trials": args.trials, "eta": args.eta, "min_rounds": args.min_rounds, "max_rounds": args.max_rounds,
+              "early_stopping": args.early_stopping, "max_workers": args.workers, "seed": args.seed}
+    for kind in args.models:
+        print(f"🔄 {kind}: {args.trials} configuraciones, {args.folds} cortes de {args.horizon} días, eta={args.eta}...")
+        results, history = tune(df, kind, segments, args.folds, args.horizon, **search)
+        path = save_tuning(kind, results, args.tuning_dir)
+        history.to_csv(os.path.join(args.tuning_dir, f"{kind}_trials.csv"), index=False)
+        print(f"✅ Hiperparámetros de {kind} guardados en: {path}")
+        if args.forecast:
+            forecast, _ = forecast_segments(df, kind, args.forecast, segments, tuning_dir=args.tuning_dir)
+            forecast.to_csv(os.path.join(args.tuning_dir, f"{kind}_segment_forecast.csv"), index=False)
+            print(f"✅ Pronóstico por segmento ({kind}) guardado en: {args.tuning_dir}")
@@ -0,0 +1,47 @@
+import functools
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import dataset_store
+import ingest
+
+
+def multi_series_store(tmp_path, monkeypatch):
+    ds = pd.date_range("2024-01-01", periods=60, freq="D")
+    rows = [
+        {"Date": day, "sku": sku, "dc": dc, "Sales_Volume": 100 * sku + 10 * dc + i}
+        for sku in (1, 2) for dc in (0, 1) for i, day in enumerate(ds)
+    ]
+    csv_path = tmp_path / "ventas.csv"
+    pd.DataFrame(rows).to_csv(csv_path, index=False)
+    store_dir = str(tmp_path / "store")
+    ingest.ingest_sales(str(csv_path), store_dir=store_dir, series_cols=["sku", "dc"])
+
+    # Loaders read the test store only (no Arrow copies, no project CSV)
+    monkeypatch.setattr(dataset_store, "arrow_current", lambda name, arrow_dir=None: False)
+    monkeypatch.setattr(dataset_store, "store_exists", functools.partial(ingest.store_exists, store_dir=store_dir))
+    monkeypatch.setattr(dataset_store, "read_store", functools.partial(ingest.read_store, store_dir=store_dir))
+    return pd.DataFrame(rows)
+
+
+def test_load_sales_one_series_from_multi_series_store(tmp_path, monkeypatch):
+    rows = multi_series_store(tmp_path, monkeypatch)
+
+    df = dataset_store.load_sales("2|1")
+    expected = rows[(rows["sku"] == 2) & (rows["dc"] == 1)]
+    assert list(df.columns) == ["ds", "y"]
+    assert len(df) == 60
+    assert df["y"].tolist() == expected["Sales_Volume"].tolist()
+
+
+def test_load_sales_aggregate_and_unknown_series(tmp_path, monkeypatch):
+    rows = multi_series_store(tmp_path, monkeypatch)
+
+    total = dataset_store.load_sales()
+    assert total["y"].tolist() == rows.groupby("Date")["Sales_Volume"].sum().tolist()
+    assert dataset_store.load_sales("9|9").empty
+    assert sorted(dataset_store.series_ids()) == ["1|0", "1|1", "2|0", "2|1"]
@@ -0,0 +1,90 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from features import FeaturePipeline, easter_dates, holiday_flags
+
+
+def daily_series(start="2020-01-01", end="2021-12-31"):
+    ds = pd.date_range(start, end, freq="D")
+    return pd.DataFrame({"ds": ds, "y": np.arange(len(ds), dtype=np.float64)})
+
+
+def test_lags_follow_dates_across_gaps():
+    full = daily_series()
+    gaps = full[~full["ds"].between("2020-06-01", "2020-06-10") & (full["ds"] != "2021-03-15")].reset_index(drop=True)
+    pipeline = FeaturePipeline(exogenous=[], holidays=False)
+
+    X = pipeline.fit_transform(gaps)
+    by_date = dict(zip(gaps["ds"], gaps["y"]))
+    expected = [by_date.get(day - pd.Timedelta(days=365), np.nan) for day in gaps["ds"]]
+    np.testing.assert_array_equal(X["lag_365"].to_numpy(), np.array(expected))
+
+    # Rows whose lagged day exists get the same value as in the gap-free series
+    X_full = pipeline.fit_transform(full).set_index(full["ds"])
+    row = gaps.index[gaps["ds"] == "2021-07-01"][0]
+    assert X.loc[row, "lag_365"] == X_full.loc[pd.Timestamp("2021-07-01"), "lag_365"]
+    assert np.isnan(X.loc[gaps.index[gaps["ds"] == "2021-06-05"][0], "lag_365"])
+
+
+def test_rolling_means_skip_missing_days():
+    full = daily_series()
+    gaps = full[~full["ds"].between("2020-06-01", "2020-06-10")].reset_index(drop=True)
+    X = FeaturePipeline(exogenous=[], holidays=False, windows=(7,)).fit_transform(gaps)
+
+    # Window for 2021-06-08 covers 2020-06-02..2020-06-08 (all missing) -> no value
+    assert np.isnan(X.loc[gaps.index[gaps["ds"] == "2021-06-08"][0], "rolling_mean_7"])
+    # Window for 2021-06-13 covers 2020-06-07..2020-06-13: only the 11th..13th were observed
+    expected = gaps.loc[gaps["ds"].between("2020-06-11", "2020-06-13"), "y"].mean()
+    assert X.loc[gaps.index[gaps["ds"] == "2021-06-13"][0], "rolling_mean_7"] == expected
+
+
+def test_lags_stay_within_each_series():
+    left = daily_series().assign(series_id="a")
+    right = daily_series("2020-03-01").assign(series_id="b", y=lambda df: df["y"] + 10_000)
+    frame = pd.concat([left, right.drop(index=[40, 41])], ignore_index=True)
+    X = FeaturePipeline(exogenous=[], holidays=False).fit_transform(frame, series_col="series_id")
+
+    row = frame.index[(frame["series_id"] == "b") & (frame["ds"] == "2021-03-01")][0]
+    assert X.loc[row, "lag_365"] == right.loc[right["ds"] == "2020-03-01", "y"].iloc[0]
+    first_b = frame.index[(frame["series_id"] == "b") & (frame["ds"] == "2021-02-27")][0]
+    assert np.isnan(X.loc[first_b, "lag_365"])
+
+
+def test_future_features_context_is_cut_by_date():
+    history = daily_series()
+    history = history[~history["ds"].between("2021-01-01", "2021-01-31")].reset_index(drop=True)
+    dates, X = FeaturePipeline(exogenous=[], holidays=False).fit(history).future_features(history, 40)
+
+    assert dates[0] == pd.Timestamp("2022-01-01")
+    # 2022-01-01 - 365 days = 2021-01-01, which is missing from the history
+    assert np.isnan(X["lag_365"].iloc[0])
+    # 2022-02-05 - 365 days = 2021-02-05, observed
+    assert X["lag_365"].iloc[35] == history.loc[history["ds"] == "2021-02-05", "y"].iloc[0]
+
+
+def test_easter_dates():
+    easter = easter_dates([2019, 2024, 2025, 2038])
+    assert [str(day) for day in easter] == ["2019-04-21", "2024-03-31", "2025-04-20", "2038-04-25"]
+
+
+def test_holiday_flags():
+    dates = pd.to_datetime([
+        "2024-01-01", "2024-09-16", "2024-12-25",   # fixed holidays
+        "2024-03-28", "2024-03-29",                 # Holy Thursday and Good Friday (Easter 2024-03-31)
+        "2025-04-17", "2025-04-18",                 # Holy Thursday and Good Friday (Easter 2025-04-20)
+        "2024-03-30", "2024-03-31", "2024-07-10",   # not holidays
+    ])
+    np.testing.assert_array_equal(holiday_flags(dates), [1, 1, 1, 1, 1, 1, 1, 0, 0, 0])
+    assert holiday_flags(dates).dtype == np.int8
+
+
+def test_max_horizon_is_the_shortest_lag_or_window_shift():
+    assert FeaturePipeline().max_horizon == 365
+    assert FeaturePipeline(lags=(400,), window_shift=180).max_horizon == 180
+    assert FeaturePipeline(lags=(400,), windows=()).max_horizon == 400
+    assert FeaturePipeline.legacy().max_horizon is None